@@ -1,27 +1,369 @@
+import atexit
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import logging
+import math
+import mimetypes
 import os
-from datetime import date, datetime, timedelta
-
-from flask import Flask, render_template, request, redirect, url_for
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from functools import wraps
+from datetime import date, datetime, time as dtime, timedelta
+
+import click
+import numpy as np
+from flask import (
+    Blueprint, Flask, abort, appcontext_pushed, before_render_template, current_app, g, has_request_context, jsonify,
+    render_template, request, redirect, send_from_directory, stream_with_context, template_rendered, url_for,
+)
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
-
-app = Flask(__name__)
-
-db_url = os.getenv("DATABASE_URL")
-
-
-if db_url and db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
-
-
-if db_url and db_url.startswith("postgresql://"):
-    db_url = db_url.replace("postgresql://", "postgresql+psycopg://", 1)
-
-
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url or "sqlite:///fittrack.db"
+from markupsafe import Markup
+from sqlalchemy import case, delete, event, exc, func, insert, select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.http import is_resource_modified
+
+_import_started = time.perf_counter()
+
+# Routes, hooks, template globals and CLI commands; create_app() registers it
+bp = Blueprint("main", __name__, cli_group=None)
+
+
+def database_url(url) -> str:
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url and url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return url or "sqlite:///fittrack.db"
+
+
+def env_int(name: str, default: int) -> int:
+    v = (os.getenv(name) or "").strip()
+    return int(v) if v else default
+
+
+# SQLite: set on every new connection. WAL lets readers run alongside the
+# single writer across gunicorn workers; busy_timeout waits out the lock
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+    "mmap_size": env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    "cache_size": -env_int("SQLITE_CACHE_KB", 20000),
+    "temp_store": "MEMORY",
+}
+
+
+def engine_options(url: str) -> dict:
+    """Engine/pool settings for the DATABASE_URL's backend, from env vars."""
+    if url.startswith("sqlite"):
+        return {"connect_args": {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}}
+    if url.startswith("postgresql"):
+        # psycopg prepares a statement server-side after this many runs; 0
+        # disables it (needed behind pgbouncer in transaction mode).
+        prepare = env_int("DB_PREPARE_THRESHOLD", 5)
+        return {
+            "pool_size": env_int("DB_POOL_SIZE", 5),
+            "max_overflow": env_int("DB_MAX_OVERFLOW", 5),
+            "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+            "pool_timeout": env_int("DB_POOL_TIMEOUT", 10),
+            "pool_pre_ping": bool(env_int("DB_POOL_PRE_PING", 1)),
+            "connect_args": {"prepare_threshold": prepare or None},
+        }
+    return {}
+
+
+# Bound to the app in create_app()
+db = SQLAlchemy()
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, conn_record):
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cur = dbapi_conn.cursor()
+    in_memory = cur.execute("PRAGMA journal_mode").fetchone()[0] == "memory"
+    for name, value in SQLITE_PRAGMAS.items():
+        if name == "journal_mode" and in_memory:
+            continue
+        cur.execute(f"PRAGMA {name}={value}")
+    cur.close()
+
+
+def pool_stats() -> dict:
+    pool = db.engine.pool
+    stats = {"dialect": db.engine.dialect.name, "pool": type(pool).__name__, "pool_status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+# --- Request instrumentation ------------------------------------------------
+# Every request counts its SQL statements and DB time (engine cursor events)
+# and its template render time, reports them in a Server-Timing header and a
+# JSON log line, and feeds histograms served as Prometheus text at /metrics.
+# Each process keeps its own numbers and dumps them to METRICS_DIR/<pid>.json;
+# /metrics sums the files, so the totals cover every gunicorn worker.
+
+REQUEST_LOG = bool(env_int("REQUEST_LOG", 1))
+SLOW_QUERY_MS = env_int("SLOW_QUERY_MS", 0)  # 0 = off
+NPLUSONE_THRESHOLD = env_int("NPLUSONE_THRESHOLD", 0)  # same statement N+ times in a request; 0 = off
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "fittrack-metrics")
+METRICS_FLUSH_S = 1.0
+
+request_log = logging.getLogger("fittrack.request")
+sql_log = logging.getLogger("fittrack.sql")
+startup_log = logging.getLogger("fittrack.startup")
+for _logger in (request_log, sql_log, startup_log):
+    if not _logger.handlers:
+        _logger.addHandler(logging.StreamHandler())
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+
+_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+HISTOGRAMS = {
+    "fittrack_request_seconds": ("Request wall time", _SECONDS),
+    "fittrack_request_db_seconds": ("Time spent in SQL per request", _SECONDS),
+    "fittrack_request_render_seconds": ("Template render time per request", _SECONDS),
+    "fittrack_request_queries": ("SQL statements per request", (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)),
+}
+COUNTERS = {
+    "fittrack_requests_total": "Requests by endpoint, method and status",
+    "fittrack_slow_queries_total": "Statements slower than SLOW_QUERY_MS",
+    "fittrack_nplusone_total": "Requests repeating a statement NPLUSONE_THRESHOLD+ times",
+    "fittrack_ingest_samples_total": "Ingested activity/workout samples by type and outcome",
+    "fittrack_read_cache_total": "Read cache lookups by kind and result (local, shared or miss)",
+}
+
+# (name, ((label, value), ...)) -> counter value, or [per-bucket counts..., +Inf, sum]
+_metrics = {}
+_metrics_lock = threading.Lock()
+_flusher_pid = None
+
+# phase -> ms. A preloaded gunicorn worker inherits the master's import,
+# migrate and warm phases and adds its own first_request.
+STARTUP = {}
+_startup_pid = os.getpid()
+_first_request_pid = None
+
+
+def startup_phase(name: str, started: float):
+    STARTUP[name] = round((time.perf_counter() - started) * 1000, 1)
+    startup_log.info(json.dumps({"event": "startup", "phase": name, "pid": os.getpid(), "ms": STARTUP[name]}))
+
+
+def _first_request_done():
+    global _first_request_pid
+    _first_request_pid = os.getpid()
+
+
+def _observe(name: str, labels: tuple, value: float):
+    buckets = HISTOGRAMS[name][1]
+    with _metrics_lock:
+        h = _metrics.setdefault((name, labels), [0] * (len(buckets) + 2))
+        h[next((i for i, b in enumerate(buckets) if value <= b), len(buckets))] += 1
+        h[-1] += value
+
+
+def _count(name: str, labels: tuple, n: int = 1):
+    with _metrics_lock:
+        _metrics[(name, labels)] = _metrics.get((name, labels), 0) + n
+
+
+def _flush_metrics():
+    with _metrics_lock:
+        entries = [[name, list(labels), list(v) if isinstance(v, list) else v] for (name, labels), v in _metrics.items()]
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        request_log.warning("metrics flush failed: %s", e)
+
+
+def _start_metrics_flusher():
+    """Dump this process's metrics every METRICS_FLUSH_S in the background.
+
+    Started on the first request rather than at import so each gunicorn
+    worker (forked after a --preload import) runs its own thread.
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+
+    def loop():
+        while True:
+            time.sleep(METRICS_FLUSH_S)
+            _flush_metrics()
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Dumps left by processes that are gone (an earlier run, a recycled worker)
+os.makedirs(METRICS_DIR, exist_ok=True)
+for _name in os.listdir(METRICS_DIR):
+    _pid = _name.split(".")[0]
+    if _pid.isdigit() and not _pid_alive(int(_pid)):
+        try:
+            os.unlink(os.path.join(METRICS_DIR, _name))
+        except OSError:
+            pass
+
+
+def collect_metrics() -> dict:
+    """All processes' dumps summed: same shape as _metrics."""
+    _flush_metrics()
+    merged = {}
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue  # mid-replace or unreadable; next scrape gets it
+        for metric, labels, v in entries:
+            key = (metric, tuple(tuple(l) for l in labels))
+            if isinstance(v, list):
+                cur = merged.setdefault(key, [0] * len(v))
+                merged[key] = [a + b for a, b in zip(cur, v)]
+            else:
+                merged[key] = merged.get(key, 0) + v
+    return merged
+
+
+def render_metrics(merged: dict) -> str:
+    def fmt(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f"{name}{fmt(l)} {v}" for (n, l), v in sorted(merged.items()) if n == name]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (n, l), v in sorted(merged.items()):
+            if n != name:
+                continue
+            total = 0
+            for bound, c in zip(list(buckets) + ["+Inf"], v[:-1]):
+                total += c
+                lines.append(f"{name}_bucket{fmt(l, [('le', bound)])} {total}")
+            lines.append(f"{name}_sum{fmt(l)} {round(v[-1], 6)}")
+            lines.append(f"{name}_count{fmt(l)} {total}")
+    return "\n".join(lines) + "\n"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"]
+    if not has_request_context() or "req_start" not in g:
+        return
+    g.sql_count += 1
+    g.sql_s += elapsed
+    if NPLUSONE_THRESHOLD:
+        g.statements[statement] += 1
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        _count("fittrack_slow_queries_total", (("endpoint", request.endpoint or "-"),))
+        sql_log.warning(json.dumps({
+            "event": "slow_query", "endpoint": request.endpoint, "path": request.path,
+            "ms": round(elapsed * 1000, 1), "statement": " ".join(statement.split())[:500],
+        }))
+
+
+# Template signal receivers; create_app() connects them to its app
+def _render_start(sender, template, context, **extra):
+    if "req_start" in g:
+        g.render_start = time.perf_counter()
+
+
+def _render_end(sender, template, context, **extra):
+    if "render_start" in g:
+        g.render_s += time.perf_counter() - g.pop("render_start")
+
+
+@bp.before_app_request
+def _start_request_timer():
+    g.req_start = time.perf_counter()
+    g.sql_count, g.sql_s, g.render_s = 0, 0.0, 0.0
+    g.statements = Counter()
+
+
+@bp.after_app_request
+def _record_request(resp):
+    # Streamed bodies (exports) finish after this; their numbers stop here.
+    if "req_start" not in g:
+        return resp
+    total = time.perf_counter() - g.req_start
+    endpoint = request.endpoint or "-"
+    resp.headers.add(
+        "Server-Timing",
+        f'db;dur={g.sql_s * 1000:.1f};desc="{g.sql_count} queries", '
+        f"tpl;dur={g.render_s * 1000:.1f}, app;dur={total * 1000:.1f}",
+    )
 
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db = SQLAlchemy(app)
+    labels = (("endpoint", endpoint), ("method", request.method))
+    _count("fittrack_requests_total", labels + (("status", resp.status_code),))
+    _observe("fittrack_request_seconds", labels, total)
+    _observe("fittrack_request_db_seconds", labels, g.sql_s)
+    _observe("fittrack_request_render_seconds", labels, g.render_s)
+    _observe("fittrack_request_queries", labels, g.sql_count)
+
+    if NPLUSONE_THRESHOLD and g.statements:
+        statement, n = g.statements.most_common(1)[0]
+        if n >= NPLUSONE_THRESHOLD:
+            _count("fittrack_nplusone_total", (("endpoint", endpoint),))
+            sql_log.warning(json.dumps({
+                "event": "n_plus_one", "endpoint": endpoint, "path": request.path,
+                "repeats": n, "statement": " ".join(statement.split())[:500],
+            }))
+    if REQUEST_LOG:
+        request_log.info(json.dumps({
+            "method": request.method, "path": request.path, "endpoint": endpoint,
+            "status": resp.status_code, "ms": round(total * 1000, 1),
+            "db_ms": round(g.sql_s * 1000, 1), "queries": g.sql_count,
+            "render_ms": round(g.render_s * 1000, 1),
+        }))
+    _start_metrics_flusher()
+    if _first_request_pid != os.getpid():
+        _first_request_done()
+        startup_phase("first_request", g.req_start)
+    return resp
 
 
 class DayLog(db.Model):
@@ -48,6 +390,23 @@ class DayLog(db.Model):
 
     notes = db.Column(db.Text, nullable=True)
 
+    # compliance_score() as stored by refresh_weekly_rollups(), which every
+    # DayLog write path already runs for the touched weeks
+    compliance = db.Column(db.SmallInteger, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Streak and "compliant days" scans: score >= n, in day order
+        db.Index("ix_day_logs_compliance_day", "compliance", "day"),
+        # Partial covering index for _trend_rows(): measured days only, in day order
+        db.Index(
+            "ix_day_logs_measured",
+            "day",
+            "weight_am",
+            "waist_in",
+            sqlite_where=db.text("weight_am IS NOT NULL OR waist_in IS NOT NULL"),
+            postgresql_where=db.text("weight_am IS NOT NULL OR waist_in IS NOT NULL"),
+        ),
+    )
 
 
 class Settings(db.Model):
@@ -76,6 +435,9 @@ class Meal(db.Model):
     protein_g = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # (day, id) order: history pages, exports and archiving
+    __table_args__ = (db.Index("ix_meals_day_id", "day", "id"),)
+
 class WorkoutLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     day = db.Column(db.Date, index=True, nullable=False)
@@ -85,28 +447,750 @@ class WorkoutLog(db.Model):
     notes = db.Column(db.String(250), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index("ix_workout_log_day_id", "day", "id"),)
+
+
+class TargetPlan(db.Model):
+    # Cal/protein targets over an inclusive day range; the newest plan wins.
+    __tablename__ = "target_plans"
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(200), nullable=False)
+    start_day = db.Column(db.Date, nullable=False)
+    end_day = db.Column(db.Date, nullable=False)
+    cal_target = db.Column(db.Integer, nullable=False)
+    prot_target = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_target_plans_range", "start_day", "end_day"),)
+
+    @property
+    def days(self) -> int:
+        return (self.end_day - self.start_day).days + 1
+
+
+class WeeklyRollup(db.Model):
+    # Per-week (Mon-Sun) sums and counts over DayLog, kept current on commit.
+    __tablename__ = "weekly_rollups"
+    week_start = db.Column(db.Date, primary_key=True)
+    days = db.Column(db.Integer, nullable=False, default=0)
+
+    weight_sum = db.Column(db.Float, nullable=False, default=0)
+    weight_n = db.Column(db.Integer, nullable=False, default=0)
+    waist_sum = db.Column(db.Float, nullable=False, default=0)
+    waist_n = db.Column(db.Integer, nullable=False, default=0)
+    cal_sum = db.Column(db.Integer, nullable=False, default=0)
+    cal_n = db.Column(db.Integer, nullable=False, default=0)
+    prot_sum = db.Column(db.Integer, nullable=False, default=0)
+    prot_n = db.Column(db.Integer, nullable=False, default=0)
+    miles_sum = db.Column(db.Float, nullable=False, default=0)
+    miles_n = db.Column(db.Integer, nullable=False, default=0)
+    active_sum = db.Column(db.Integer, nullable=False, default=0)
+    active_n = db.Column(db.Integer, nullable=False, default=0)
+
+    rings_n = db.Column(db.Integer, nullable=False, default=0)
+    comp_sum = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+    # Monotonic write counters read by conditional GETs: "global", "all-days"
+    # and one "day:YYYY-MM-DD" key per touched day.
+    __tablename__ = "data_versions"
+    key = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SyncOp(db.Model):
+    # Client-generated ids of offline writes already applied by /sync.
+    __tablename__ = "sync_ops"
+    id = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class ArchiveSegment(db.Model):
+    # An append-only gzip JSONL file of rows moved out of a hot table,
+    # covering [start_day, end_day]; path is relative to config["ARCHIVE_DIR"].
+    __tablename__ = "archive_segments"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    start_day = db.Column(db.Date, nullable=False)
+    end_day = db.Column(db.Date, nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    rows = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_archive_segments_range", "kind", "start_day", "end_day"),)
+
+
+class MealArchiveDay(db.Model):
+    # Per-day totals of the meals a segment holds for that day; these rows
+    # are what makes a segment's meals count (restoring a day deletes them).
+    __tablename__ = "meal_archive_days"
+    day = db.Column(db.Date, primary_key=True)
+    segment_id = db.Column(db.Integer, db.ForeignKey("archive_segments.id"), primary_key=True)
+    meals = db.Column(db.Integer, nullable=False)
+    calories = db.Column(db.Integer, nullable=False)
+    protein_g = db.Column(db.Integer, nullable=False)
+
+
+class MealFrequency(db.Model):
+    # One row per distinct meal name (see meal_key), kept current on commit
+    # from Meal inserts/deletes. rank = ln(sum(exp(day / MEAL_RANK_TAU_DAYS)))
+    # over every log of the name: frequent and recent both push it up, and
+    # because it is anchored to a fixed epoch instead of today, ORDER BY rank
+    # stays valid without ever being recomputed.
+    __tablename__ = "meal_frequency"
+    key = db.Column(db.String(120), primary_key=True)
+    name = db.Column(db.String(120), nullable=False)  # as last logged
+    count = db.Column(db.Integer, nullable=False, default=0)
+    rank = db.Column(db.Float, nullable=False, index=True)
+    last_day = db.Column(db.Date, nullable=False)
+    calories = db.Column(db.Integer, nullable=True)  # from the latest log
+    protein_g = db.Column(db.Integer, nullable=True)
+
+
+# --- Schema migrations ------------------------------------------------------
+# schema_migrations records which numbered steps have run. An empty database
+# gets the current models in one create_all and is stamped at the latest
+# version; an existing one runs the steps it is missing, in order, inside one
+# locked transaction. Steps must tolerate objects that already exist: a
+# database from before versioning runs the baseline against today's models.
+# The gunicorn master runs this once per deploy (gunicorn.conf.py); any other
+# process checks the version once, on its first app context.
+
+class SchemaMigration(db.Model):
+    __tablename__ = "schema_migrations"
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+MIGRATIONS = {}
+MIGRATION_LOCK_ID = 0x66697474  # pg_advisory_xact_lock key
+_schema_ready = False
+
+
+def migration(version: int):
+    def register(fn):
+        MIGRATIONS[version] = fn
+        return fn
+    return register
+
+
+def create_indexes(conn, *tables):
+    # create_all skips indexes on tables that already exist; an index on a
+    # column that a later step adds waits for that step
+    insp = db.inspect(conn)
+    for table in tables:
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for ix in table.indexes:
+            if all(c.name in have for c in ix.columns):
+                ix.create(conn, checkfirst=True)
+
+
+@migration(1)
+def baseline(conn):
+    # What import used to do on every start
+    db.metadata.create_all(conn)
+    create_indexes(conn, DayLog.__table__)
+
+
+@migration(2)
+def day_id_indexes(conn):
+    create_indexes(conn, Meal.__table__, WorkoutLog.__table__)
+
+
+@migration(3)
+def day_compliance(conn):
+    if "compliance" not in {c["name"] for c in db.inspect(conn).get_columns("day_logs")}:
+        conn.execute(db.text("ALTER TABLE day_logs ADD COLUMN compliance SMALLINT NOT NULL DEFAULT 0"))
+    conn.execute(update(DayLog).values(compliance=compliance_expr()))
+    create_indexes(conn, DayLog.__table__)
+
+
+@migration(4)
+def derived_tables(conn):
+    # The commit hooks only keep these current for writes made after they
+    # were added; fill them once from every existing row
+    refresh_weekly_rollups(conn)
+    rebuild_meal_frequency(conn)
+    # Pages pick up the new tables through BUILD_ID in their ETags
+    conn.info.pop("version_keys", None)
+
+
+@migration(5)
+def measured_index(conn):
+    # ix_day_logs_weighed (weight_am only) couldn't serve the trend query
+    conn.execute(db.text("DROP INDEX IF EXISTS ix_day_logs_weighed"))
+    create_indexes(conn, DayLog.__table__)
+
+
+def migrate() -> list:
+    """Bring the schema up to date; returns the names of the steps applied.
+
+    Concurrent callers serialize on a lock (an advisory lock on Postgres,
+    BEGIN IMMEDIATE on SQLite); the later ones find nothing left to do.
+    """
+    global _schema_ready
+    started = time.perf_counter()
+    applied = []
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_ID)))
+        elif conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        tables = db.inspect(conn).get_table_names()
+        if not tables:
+            db.metadata.create_all(conn)
+            done = set()
+            fresh = True
+        else:
+            SchemaMigration.__table__.create(conn, checkfirst=True)
+            done = set(conn.scalars(select(SchemaMigration.version)))
+            fresh = False
+        for version in sorted(set(MIGRATIONS) - done):
+            step = MIGRATIONS[version]
+            if not fresh:
+                step(conn)
+            conn.execute(insert(SchemaMigration).values(version=version, name=step.__name__))
+            applied.append(step.__name__)
+    _schema_ready = True
+    startup_phase("migrate", started)
+    return applied
+
+
+def ensure_schema():
+    """Once per process: one version query, migrating if the schema is behind."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        try:
+            version = conn.scalar(select(func.max(SchemaMigration.version)))
+        except exc.DBAPIError:
+            version = None
+    if version is None or version < max(MIGRATIONS):
+        migrate()
+    else:
+        _schema_ready = True
+        startup_phase("schema_check", started)
+
 
-with app.app_context():
-    db.create_all()
+def _schema_on_first_context(sender, **extra):
+    ensure_schema()
+
+
+@bp.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    # (the app context this runs in has already called ensure_schema())
+    applied = migrate()
+    print(f"Applied: {', '.join(applied)}." if applied else f"Schema is at version {max(MIGRATIONS)}.")
 
 def get_or_create_day(d: date) -> DayLog:
+    # Flush only; the caller commits so the new row shares its transaction.
     log = DayLog.query.filter_by(day=d).first()
     if not log:
-        log = DayLog(day=d, cal_target=2000, prot_target=190)
+        log = get_day_default(d)
         db.session.add(log)
-        db.session.commit()
+        db.session.flush()
     return log
 
 
-def recalc_totals(d: date):
+DEFAULT_TARGETS = (2000, 190)  # cal, protein for days no plan covers
+
+
+def plan_for(d: date):
+    return (
+        TargetPlan.query.filter(TargetPlan.start_day <= d, TargetPlan.end_day >= d)
+        .order_by(TargetPlan.created_at.desc(), TargetPlan.id.desc())
+        .first()
+    )
+
+
+def get_day_default(d: date) -> DayLog:
+    # Unsaved stand-in for a day that has no row yet; targets come from the
+    # covering plan, if any.
+    plan = plan_for(d)
+    cal_target, prot_target = (plan.cal_target, plan.prot_target) if plan else DEFAULT_TARGETS
+    return DayLog(day=d, cal_target=cal_target, prot_target=prot_target, calories_total=0, protein_g_total=0)
+
+
+def default_targets(session, days) -> dict:
+    """day -> (cal_target, prot_target) as get_day_default() would give
+    them, for many days from one query over the plans covering their span."""
+    lo, hi = min(days), max(days)
+    plans = session.execute(
+        select(TargetPlan.start_day, TargetPlan.end_day, TargetPlan.cal_target, TargetPlan.prot_target)
+        .where(TargetPlan.start_day <= hi, TargetPlan.end_day >= lo)
+        .order_by(TargetPlan.created_at.desc(), TargetPlan.id.desc())
+    ).all()
+    targets = {}
+    for d in days:
+        plan = next((p for p in plans if p.start_day <= d <= p.end_day), None)
+        targets[d] = (plan.cal_target, plan.prot_target) if plan else DEFAULT_TARGETS
+    return targets
+
+
+def apply_plan(plan: TargetPlan):
+    """Add a plan and set its targets on existing days in range in one UPDATE.
+
+    Days without a row pick the plan up lazily via get_day_default(). The
+    caller commits.
+    """
+    db.session.add(plan)
+    db.session.flush()
+    db.session.execute(
+        update(DayLog)
+        .where(DayLog.day.between(plan.start_day, plan.end_day))
+        .values(cal_target=plan.cal_target, prot_target=plan.prot_target)
+    )
+    first_week = week_start_of(plan.start_day)
+    refresh_weekly_rollups(
+        db.session,
+        {first_week + timedelta(days=7 * i) for i in range((plan.end_day - first_week).days // 7 + 1)},
+    )
+
+
+def get_day(d: date) -> DayLog:
+    # Read-only lookup for GET handlers: never inserts.
+    return DayLog.query.filter_by(day=d).first() or get_day_default(d)
+
+
+def add_meal_totals(d: date, calories, protein_g) -> DayLog:
+    # Apply a meal's delta to the day's running totals in the caller's
+    # transaction; the returned log carries the new totals (via RETURNING).
     log = get_or_create_day(d)
-    cals, prot = db.session.query(
-        func.coalesce(func.sum(Meal.calories), 0),
-        func.coalesce(func.sum(Meal.protein_g), 0),
-    ).filter(Meal.day == d).first()
-    log.calories_total = int(cals or 0)
-    log.protein_g_total = int(prot or 0)
+    cals, prot = db.session.execute(
+        update(DayLog)
+        .where(DayLog.day == d)
+        .values(
+            calories_total=func.coalesce(DayLog.calories_total, 0) + (calories or 0),
+            protein_g_total=func.coalesce(DayLog.protein_g_total, 0) + (protein_g or 0),
+        )
+        .returning(DayLog.calories_total, DayLog.protein_g_total)
+        .execution_options(synchronize_session=False)
+    ).one()
+    set_committed_value(log, "calories_total", cals)
+    set_committed_value(log, "protein_g_total", prot)
+    return log
+
+
+def week_start_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def week_start_expr(col):
+    # Monday of the column's week, in the engine's own date arithmetic
+    # (literal modifiers so the SELECT and GROUP BY expressions match exactly)
+    if db.engine.dialect.name == "sqlite":
+        return func.date(col, db.literal_column("'weekday 0'"), db.literal_column("'-6 days'"))
+    return db.cast(func.date_trunc(db.literal_column("'week'"), col), db.Date)
+
+
+def compliance_expr():
+    # SQL mirror of compliance_score()
+    def flag(cond):
+        return case((cond, 1), else_=0)
+
+    return (
+        flag(DayLog.calories_total <= DayLog.cal_target)
+        + flag(DayLog.protein_g_total >= DayLog.prot_target)
+        + flag(DayLog.walk_done.is_(True))
+        + flag(DayLog.lift_done.is_(True))
+        + flag(DayLog.rings_closed.is_(True))
+    )
+
+
+def day_number_expr(col):
+    # Whole days since a fixed epoch, so consecutive dates differ by exactly 1
+    if db.engine.dialect.name == "sqlite":
+        return db.cast(func.julianday(col), db.Integer)
+    return col - db.literal_column("DATE '1970-01-01'")
+
+
+def refresh_weekly_rollups(session, weeks=None):
+    """Recompute stored compliance scores and the rollup rows for the given
+    week starts (all weeks if None)."""
+    wk = week_start_expr(DayLog.day)
+    score = update(DayLog).values(compliance=compliance_expr()).where(DayLog.compliance != compliance_expr())
+
+    def summed(col):
+        return func.coalesce(func.sum(col), 0)
+
+    rollup = select(
+        wk,
+        func.count(),
+        summed(DayLog.weight_am),
+        func.count(DayLog.weight_am),
+        summed(DayLog.waist_in),
+        func.count(DayLog.waist_in),
+        summed(DayLog.calories_total),
+        func.count(DayLog.calories_total),
+        summed(DayLog.protein_g_total),
+        func.count(DayLog.protein_g_total),
+        summed(DayLog.walking_miles),
+        func.count(DayLog.walking_miles),
+        summed(DayLog.active_calories),
+        func.count(DayLog.active_calories),
+        summed(case((DayLog.rings_closed.is_(True), 1), else_=0)),
+        summed(DayLog.compliance),
+    ).group_by(wk)
+    clear = delete(WeeklyRollup)
+
+    if weeks is not None:
+        weeks = sorted(set(weeks))
+        if not weeks:
+            return
+        # The day range can use the day index; the week test drops the days
+        # of untouched weeks inside it
+        day_in_weeks = db.and_(DayLog.day.between(weeks[0], weeks[-1] + timedelta(days=6)), wk.in_(weeks))
+        rollup = rollup.where(day_in_weeks)
+        clear = clear.where(WeeklyRollup.week_start.in_(weeks))
+        score = score.where(day_in_weeks)
+
+    session.execute(score.execution_options(synchronize_session=False))
+    session.execute(clear)
+    session.execute(
+        insert(WeeklyRollup).from_select(
+            [
+                "week_start", "days",
+                "weight_sum", "weight_n", "waist_sum", "waist_n",
+                "cal_sum", "cal_n", "prot_sum", "prot_n",
+                "miles_sum", "miles_n", "active_sum", "active_n",
+                "rings_n", "comp_sum",
+            ],
+            rollup,
+        )
+    )
+
+
+def touch_versions(session, *keys):
+    # For Core writes the flush hook can't see; bumped at commit.
+    session.info.setdefault("version_keys", set()).update(keys)
+
+
+def day_keys(days) -> list:
+    # Per-day version keys; "all-days" is for writes that really touch every day
+    return [f"day:{d.isoformat()}" for d in days]
+
+
+def bump_versions(session, keys):
+    now = datetime.utcnow()
+    stmt = dialect_insert(DataVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"version": DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    ).returning(DataVersion.key, DataVersion.version, DataVersion.updated_at)
+    rows = session.execute(stmt, [{"key": k, "version": 1, "updated_at": now} for k in sorted(keys)])
+    # Published to the shared read cache once the commit has gone through
+    session.info.setdefault("bumped", {}).update((k, (v, t)) for k, v, t in rows)
+
+
+def _weights_changed(log: DayLog, session) -> bool:
+    if log in session.new:
+        return log.weight_am is not None or log.waist_in is not None
+    if log in session.deleted:
+        return True
+    attrs = db.inspect(log).attrs
+    return attrs.weight_am.history.has_changes() or attrs.waist_in.history.has_changes()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    days = session.info.setdefault("rollup_days", set())
+    keys = session.info.setdefault("version_keys", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (DayLog, Meal)):
+            days.add(obj.day)
+        if isinstance(obj, (DayLog, Meal, WorkoutLog)):
+            keys.add(f"day:{obj.day.isoformat()}")
+        elif isinstance(obj, TargetPlan):
+            keys.add("all-days")
+        elif isinstance(obj, Settings):
+            keys.add("settings")
+        if isinstance(obj, (Meal, SavedMeal)):
+            keys.add("meal-names")
+        if isinstance(obj, SavedMeal):
+            keys.add("saved-meals")
+        if isinstance(obj, DayLog) and _weights_changed(obj, session):
+            keys.add("weights")
+            if obj.day < date.today() - timedelta(days=TREND_TAIL_DAYS - 1):
+                keys.add("weights-backfill")
+        keys.add("global")
+    meal_logs = session.info.setdefault("meal_logs", [])
+    for sign, objs in ((1, session.new), (-1, session.deleted)):
+        meal_logs.extend((sign, m.name, m.day, m.calories, m.protein_g) for m in objs if isinstance(m, Meal))
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_changes_on_commit(session):
+    session.flush()
+    days = session.info.pop("rollup_days", None)
+    if days:
+        refresh_weekly_rollups(session, {week_start_of(d) for d in days})
+    meal_logs = session.info.pop("meal_logs", None)
+    if meal_logs:
+        apply_meal_logs(session, meal_logs)
+    keys = session.info.pop("version_keys", None)
+    if keys:
+        bump_versions(session, keys | {"global"})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_versions(session):
+    if has_request_context():
+        g.pop("data_versions", None)
+    bumped = session.info.pop("bumped", None)
+    if bumped:
+        push_shared_versions(bumped)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("rollup_days", None)
+    session.info.pop("version_keys", None)
+    session.info.pop("meal_logs", None)
+    session.info.pop("bumped", None)
+
+
+@bp.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Rebuild the weekly_rollups table from DayLog."""
+    refresh_weekly_rollups(db.session)
+    touch_versions(db.session, "global")
+    db.session.commit()
+    print(f"Rebuilt {WeeklyRollup.query.count()} weekly rollups.")
+
+
+def dialect_insert(model):
+    # INSERT that supports on_conflict_do_update/do_nothing on SQLite and Postgres
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert(model)
+
+
+def rebuild_totals(session, days=None):
+    """Set-based recompute of DayLog totals from meals (hot plus archived
+    day totals); all days if None.
+
+    Creates DayLog rows for meal days that lack one. Returns the number of
+    days updated; the caller commits.
+    """
+    all_days = db.union(select(Meal.day), select(MealArchiveDay.day)).subquery()
+    # (the WHERE also keeps SQLite from parsing ON CONFLICT as a join clause)
+    meal_days = select(all_days.c.day).where(all_days.c.day.isnot(None)).distinct()
+    if days is not None:
+        days = sorted(set(days))
+        if not days:
+            return 0
+        meal_days = meal_days.where(all_days.c.day.in_(days))
+    session.execute(
+        dialect_insert(DayLog)
+        .from_select(["day"], meal_days)
+        .on_conflict_do_nothing(index_elements=["day"])
+    )
+
+    def day_sum(hot, archived):
+        return (
+            select(func.coalesce(func.sum(hot), 0)).where(Meal.day == DayLog.day).scalar_subquery()
+            + select(func.coalesce(func.sum(archived), 0)).where(MealArchiveDay.day == DayLog.day).scalar_subquery()
+        )
+
+    cal_sum = day_sum(Meal.calories, MealArchiveDay.calories)
+    prot_sum = day_sum(Meal.protein_g, MealArchiveDay.protein_g)
+    stmt = update(DayLog).values(calories_total=cal_sum, protein_g_total=prot_sum)
+    if days is not None:
+        stmt = stmt.where(DayLog.day.in_(days))
+    n = session.execute(stmt).rowcount
+    refresh_weekly_rollups(session, None if days is None else {week_start_of(d) for d in days})
+    touch_versions(session, "global", *(["all-days"] if days is None else day_keys(days)))
+    return n
+
+
+@bp.cli.command("rebuild-totals")
+def rebuild_totals_command():
+    """Recompute every DayLog's calorie/protein totals from its meals."""
+    n = rebuild_totals(db.session)
     db.session.commit()
+    print(f"Rebuilt totals for {n} days.")
+
+
+MEAL_RANK_TAU_DAYS = 30.0  # a log from 30 days back weighs 1/e of one today
+
+
+def meal_key(name) -> str:
+    return " ".join((name or "").lower().split())
+
+
+def _logaddexp(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def _fold_meal_logs(row: dict, logs) -> dict:
+    # row: a meal_frequency row as a dict (count 0 / rank -inf when new).
+    # Returns the updated row; count <= 0 means it should go, rank NaN means
+    # a delete cancelled out too much precision and the key needs a rescan.
+    for sign, name, day, calories, protein_g in logs:
+        x = day.toordinal() / MEAL_RANK_TAU_DAYS
+        row["count"] += sign
+        if sign > 0:
+            row["rank"] = _logaddexp(row["rank"], x)
+            if row["last_day"] is None or day >= row["last_day"]:
+                row.update(name=name.strip(), last_day=day, calories=calories, protein_g=protein_g)
+        else:
+            rest = -math.expm1(x - row["rank"]) if x <= row["rank"] else 0.0
+            row["rank"] = row["rank"] + math.log(rest) if rest > 1e-9 else math.nan
+    return row
+
+
+def apply_meal_logs(session, logs):
+    """Fold (sign, name, day, calories, protein_g) meal logs (+1 added, -1
+    deleted) into meal_frequency: one read of the affected keys, one upsert.
+
+    Deletes leave last_day and the latest calories/protein alone unless the
+    name's last log goes. The caller commits.
+    """
+    by_key = {}
+    for log in logs:
+        by_key.setdefault(meal_key(log[1]), []).append(log)
+    by_key.pop("", None)
+    if not by_key:
+        return
+    table = MealFrequency.__table__
+    current = {r.key: dict(r._mapping) for r in session.execute(select(table).where(table.c.key.in_(by_key)))}
+
+    upserts, gone = [], []
+    for key, key_logs in by_key.items():
+        row = current.get(key) or {
+            "key": key, "name": "", "count": 0, "rank": -math.inf,
+            "last_day": None, "calories": None, "protein_g": None,
+        }
+        row = _fold_meal_logs(row, sorted(key_logs, key=lambda l: (l[0] < 0, l[2])))
+        if row["count"] > 0 and not math.isfinite(row["rank"]):
+            # Rare: rebuild this one name from its remaining logs
+            logs_left = session.execute(
+                select(db.literal(1), Meal.name, Meal.day, Meal.calories, Meal.protein_g)
+                .where(func.lower(func.trim(Meal.name)) == key)
+                .order_by(Meal.day, Meal.id)
+            ).all()
+            row = _fold_meal_logs({**row, "count": 0, "rank": -math.inf, "last_day": None}, logs_left)
+        if row["count"] > 0:
+            upserts.append(row)
+        else:
+            gone.append(key)
+
+    if gone:
+        session.execute(delete(MealFrequency).where(MealFrequency.key.in_(gone)))
+    if upserts:
+        stmt = dialect_insert(MealFrequency)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={c.key: stmt.excluded[c.key] for c in table.columns if c.key != "key"},
+        )
+        session.execute(stmt, upserts)
+
+
+def rebuild_meal_frequency(session) -> int:
+    """Recompute meal_frequency from every meal, archived ones included;
+    returns the number of names.
+
+    For Core bulk loads the commit hook can't see. The caller commits.
+    """
+    rows = {}
+    result = session.execute(
+        select(db.literal(1), Meal.name, Meal.day, Meal.calories, Meal.protein_g)
+        .order_by(Meal.day, Meal.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    archived = ((1, m["name"], m["day"], m["calories"], m["protein_g"]) for m in iter_archived_meals(session))
+    for log in itertools.chain(archived, result):
+        key = meal_key(log[1])
+        if key:
+            row = rows.setdefault(key, {
+                "key": key, "name": "", "count": 0, "rank": -math.inf,
+                "last_day": None, "calories": None, "protein_g": None,
+            })
+            _fold_meal_logs(row, [log])
+    session.execute(delete(MealFrequency))
+    batch = list(rows.values())
+    for i in range(0, len(batch), IMPORT_BATCH):
+        session.execute(insert(MealFrequency), batch[i:i + IMPORT_BATCH])
+    touch_versions(session, "meal-names")
+    return len(rows)
+
+
+@bp.cli.command("rebuild-meal-frequency")
+def rebuild_meal_frequency_command():
+    """Recompute the meal_frequency ranking table from all meals."""
+    n = rebuild_meal_frequency(db.session)
+    db.session.commit()
+    print(f"Ranked {n} meal names.")
+
+
+def top_meals(limit: int = 6) -> list:
+    # Highest-ranked names with their latest calories/protein; an index scan on rank.
+    return MealFrequency.query.order_by(MealFrequency.rank.desc()).limit(limit).all()
+
+
+# In-process word-prefix index over meal_frequency and saved meals, rebuilt
+# when the "meal-names" data version moves (any meal/saved-meal write).
+_meal_index = {"version": None}
+
+
+def meal_index() -> dict:
+    global _meal_index
+    version = data_versions(["meal-names"])["meal-names"][0]
+    index = _meal_index
+    if index["version"] == version:
+        return index
+
+    entries = {}
+    for f in MealFrequency.query.order_by(MealFrequency.rank.desc()):
+        entries[f.key] = {
+            "name": f.name, "calories": f.calories, "protein_g": f.protein_g,
+            "count": f.count, "last_day": f.last_day.isoformat(), "saved_id": None,
+        }
+    for sm in SavedMeal.query.order_by(SavedMeal.name):
+        # A saved meal's own numbers win over the latest log's
+        e = entries.setdefault(meal_key(sm.name), {"name": sm.name, "count": 0, "last_day": None})
+        e.update(calories=sm.calories, protein_g=sm.protein_g, saved_id=sm.id)
+    ranked = [(k, e) for k, e in entries.items() if k]
+    terms = sorted((word, i) for i, (k, _) in enumerate(ranked) for word in set(k.split()))
+    index = {
+        "version": version,
+        "keys": [k.split() for k, _ in ranked],
+        "entries": [e for _, e in ranked],
+        "terms": terms,
+        "words": [w for w, _ in terms],
+    }
+    _meal_index = index
+    return index
+
+
+def search_meals(q: str, limit: int = 8) -> list:
+    """Meals whose words start with every word of q, best ranked first."""
+    index = meal_index()
+    words = meal_key(q).split()
+    if not words:
+        return index["entries"][:limit]
+    probe = max(words, key=len)
+    lo = bisect_left(index["words"], probe)
+    hi = bisect_left(index["words"], probe + "\uffff")
+    found = []
+    for i in sorted({i for _, i in index["terms"][lo:hi]}):
+        if all(any(k.startswith(w) for k in index["keys"][i]) for w in words):
+            found.append(index["entries"][i])
+            if len(found) == limit:
+                break
+    return found
 
 
 def compliance_score(log: DayLog) -> int:
@@ -135,62 +1219,551 @@ def get_settings() -> Settings:
     return s
 
 
-@app.route("/")
-def dashboard():
-    today = date.today()
-    log = get_or_create_day(today)
-    recalc_totals(today)
-    log = DayLog.query.filter_by(day=today).first()
-    meals = Meal.query.filter_by(day=today).order_by(Meal.created_at.desc()).all()
-
-    cal_delta = (log.calories_total or 0) - (log.cal_target or 0)
-    prot_delta = (log.protein_g_total or 0) - (log.prot_target or 0)
-
-    start = today - timedelta(days=30)
-    last_logs = DayLog.query.filter(DayLog.day >= start).order_by(DayLog.day.asc()).all()
-    labels = [l.day.strftime("%b %d") for l in last_logs]
-    weights = [l.weight_am for l in last_logs]
-    compliance = [compliance_score(l) for l in last_logs]
-
-    # goal line (simple 225 -> 190 over the 30d window; editable later)
-    goal_start_wt = 225.0
-    goal_end_wt = 190.0
-    n = max(len(labels), 2)
-    goal_weights = [round(goal_start_wt + (i/(n-1))*(goal_end_wt-goal_start_wt), 2) for i in range(n)]
+def goal_settings() -> dict:
+    """start_weight, goal_weight and goal_date from Settings, read through
+    the cache so most pages skip the query."""
+    key = f"settings:{data_versions(['settings'])['settings'][0]}"
+    values = cache_get("settings", key)
+    if values is None:
+        s = get_settings()
+        values = {
+            "start_weight": s.start_weight, "goal_weight": s.goal_weight,
+            "goal_date": s.goal_date.isoformat() if s.goal_date else None,
+        }
+        cache_set(key, values)
+    return {**values, "goal_date": date.fromisoformat(values["goal_date"]) if values["goal_date"] else None}
+
+
+def expected_weight_on(d: date, start_day: date, start_wt: float, goal_date: date, goal_wt: float) -> float:
+    # Straight-line plan from the start to the goal, clamped to its ends.
+    days_total = max((goal_date - start_day).days, 1)
+    days_done = min(max((d - start_day).days, 0), days_total)
+    return start_wt + (days_done / days_total) * (goal_wt - start_wt)
+
+
+# --- Trend engine -----------------------------------------------------------
+# Weigh-in/waist history as NumPy arrays with an exponentially smoothed trend
+# (Hacker's Diet style: each day moves the trend TREND_ALPHA of the way to the
+# reading, compounded over skipped days), rolling rates of change and a
+# least-squares projection to the goal weight. Cached per process against the
+# "weights" data version. Writes to the last TREND_TAIL_DAYS days only bump
+# "weights", so the cache re-reads and re-smooths just its tail; anything
+# older also bumps "weights-backfill" and forces a full reload.
+
+TREND_ALPHA = 0.1
+TREND_TAIL_DAYS = 2
+TREND_FIT_DAYS = 28  # regression window for the projected goal date
+_EWMA_BLOCK = 24  # keeps exp(-cumsum(log decay)) in float range
+
+_trend = {"version": None}
+
+
+def ewma(values: np.ndarray, days: np.ndarray, start: float, start_day: int) -> np.ndarray:
+    """Time-aware EWMA of values observed on ordinal days (NaN = no reading),
+    continuing from trend `start` as of `start_day`.
+
+    trend[i] = decay[i] * trend[i-1] + (1 - decay[i]) * values[i], with
+    decay = (1 - TREND_ALPHA) ** (days since the previous reading), solved
+    in blocks with cumulative sums instead of a Python loop over days.
+    """
+    out = np.empty(len(values))
+    if not len(values):
+        return out
+    seen = ~np.isnan(values)
+    last_seen = np.maximum.accumulate(np.where(seen, days, start_day))
+    gaps = days - np.concatenate([[start_day], last_seen[:-1]])
+    decay = np.where(seen, np.clip((1 - TREND_ALPHA) ** np.maximum(gaps, 1), 1e-12, 1), 1.0)
+    weight = np.nan_to_num(values)
+    prev = start
+    for lo in range(0, len(values), _EWMA_BLOCK):
+        d = decay[lo:lo + _EWMA_BLOCK]
+        acc = np.cumsum(np.log(d))
+        out[lo:lo + len(d)] = np.exp(acc) * (prev + np.cumsum((1 - d) * weight[lo:lo + len(d)] * np.exp(-acc)))
+        prev = out[lo + len(d) - 1]
+    return out
+
+
+def _trend_rows(since=None) -> list:
+    # Same predicate as ix_day_logs_measured, so this is an index-only scan
+    q = select(DayLog.day, DayLog.weight_am, DayLog.waist_in).where(
+        db.or_(DayLog.weight_am.isnot(None), DayLog.waist_in.isnot(None))
+    )
+    if since is not None:
+        q = q.where(DayLog.day >= since)
+    return db.session.execute(q.order_by(DayLog.day)).all()
+
+
+def _smooth(days, raw, keep=0, old=None):
+    # Trend for raw, reusing old[:keep] and continuing from its last reading
+    seen = np.flatnonzero(~np.isnan(raw[:keep]))
+    if len(seen):
+        i = int(seen[-1])
+        return np.concatenate([old[:keep], ewma(raw[keep:], days[keep:], old[keep - 1], int(days[i]))])
+    first = np.flatnonzero(~np.isnan(raw))
+    if not len(first):
+        return np.full(len(raw), np.nan)
+    i = int(first[0])
+    return np.concatenate([np.full(i, np.nan), ewma(raw[i:], days[i:], raw[i], int(days[i]))])
+
+
+def _rate_per_week(days, trend, window: int) -> np.ndarray:
+    # Change in trend over the trailing `window` days, per 7 days
+    ok = ~np.isnan(trend)
+    out = np.full(len(days), np.nan)
+    if ok.sum() < 2:
+        return out
+    past = np.interp(days - window, days[ok], trend[ok], left=np.nan)
+    out[ok] = ((trend - past) * 7 / window)[ok]
+    return out
+
+
+def weight_trend() -> dict:
+    """Cached trend series; see the section comment above."""
+    global _trend
+    versions = data_versions(["weights", "weights-backfill"])
+    version = (versions["weights"][0], versions["weights-backfill"][0])
+    cached = _trend
+    if cached["version"] == version:
+        return cached
 
-    
-    s = get_settings()
-    # Pace calculation (based on today vs goal date)
-    days_total = max((s.goal_date - today).days, 1)
-    days_done = 0
-    # Determine start weight for pace: prefer earliest logged weight, else settings.start_weight
-    first = DayLog.query.filter(DayLog.weight_am.isnot(None)).order_by(DayLog.day.asc()).first()
-    start_wt = first.weight_am if first and first.weight_am is not None else (s.start_weight or 225.0)
-    goal_wt = s.goal_weight or 190.0
-    # Current weight: today if available else latest
-    latest = DayLog.query.filter(DayLog.weight_am.isnot(None)).order_by(DayLog.day.desc()).first()
-    current_wt = latest.weight_am if latest and latest.weight_am is not None else start_wt
-
-    start_day = first.day if first else today
-    days_done = max((today - start_day).days, 0)
-    expected = start_wt + (min(days_done, days_total) / days_total) * (goal_wt - start_wt)
+    today = date.today()
+    if cached["version"] is not None and cached["version"][1] == version[1]:
+        # Only tail days changed since the cache was built
+        since = min(cached["built_on"] - timedelta(days=TREND_TAIL_DAYS - 1), cached["last_day"] + timedelta(days=1))
+        keep = int(np.searchsorted(cached["days"], since.toordinal()))
+        rows = _trend_rows(since)
+    else:
+        keep, rows = 0, _trend_rows()
+
+    new_days = np.array([d.toordinal() for d, _, _ in rows], dtype=np.int64)
+    new_weight = np.array([np.nan if w is None else w for _, w, _ in rows], dtype=float)
+    new_waist = np.array([np.nan if w is None else w for _, _, w in rows], dtype=float)
+    if keep:
+        days = np.concatenate([cached["days"][:keep], new_days])
+        weight = np.concatenate([cached["weight"][:keep], new_weight])
+        waist = np.concatenate([cached["waist"][:keep], new_waist])
+        weight_trend_ = _smooth(days, weight, keep, cached["weight_trend"])
+        waist_trend = _smooth(days, waist, keep, cached["waist_trend"])
+    else:
+        days, weight, waist = new_days, new_weight, new_waist
+        weight_trend_ = _smooth(days, weight)
+        waist_trend = _smooth(days, waist)
+
+    _trend = {
+        "version": version,
+        "built_on": today,
+        "last_day": date.fromordinal(int(days[-1])) if len(days) else today,
+        "days": days,
+        "weight": weight,
+        "waist": waist,
+        "weight_trend": weight_trend_,
+        "waist_trend": waist_trend,
+        "rate_7": _rate_per_week(days, weight_trend_, 7),
+        "rate_30": _rate_per_week(days, weight_trend_, 30),
+    }
+    return _trend
+
+
+def trend_at(t: dict, series: str, d: date):
+    # Latest value of a trend series on or before d, or None
+    i = int(np.searchsorted(t["days"], d.toordinal(), side="right")) - 1
+    while i >= 0 and np.isnan(t[series][i]):
+        i -= 1
+    return float(t[series][i]) if i >= 0 else None
+
+
+def projected_goal_date(t: dict, goal_wt: float, today: date):
+    """Day the fitted line through the last TREND_FIT_DAYS of weigh-ins
+    reaches goal_wt; None without a downward trend."""
+    lo = int(np.searchsorted(t["days"], (today - timedelta(days=TREND_FIT_DAYS)).toordinal()))
+    x, y = t["days"][lo:], t["weight"][lo:]
+    ok = ~np.isnan(y)
+    if ok.sum() < 5:
+        return None
+    slope, intercept = np.polyfit(x[ok] - today.toordinal(), y[ok], 1)
+    if slope >= 0 or intercept <= goal_wt:
+        return today if intercept <= goal_wt else None
+    days_left = (goal_wt - intercept) / slope
+    if days_left > 3650:
+        return None
+    return today + timedelta(days=int(np.ceil(days_left)))
+
+
+def trend_summary(t: dict, today: date, goal_wt: float) -> dict:
+    def latest(series, ndigits):
+        v = trend_at(t, series, today)
+        return None if v is None else round(v, ndigits)
+
+    return {
+        "trend_weight": latest("weight_trend", 1),
+        "trend_waist": latest("waist_trend", 1),
+        "rate_7": latest("rate_7", 2),
+        "rate_30": latest("rate_30", 2),
+        "projected_goal_date": projected_goal_date(t, goal_wt, today),
+    }
+
+
+def goal_line(t: dict, today: date):
+    """(start_day, start_wt, goal_date, goal_wt) for expected_weight_on().
+
+    The line runs from settings.start_weight to the goal weight and date.
+    Settings keeps no start date, so the line starts on the first recorded
+    weigh-in's day (today when there is none). The first weigh-in's weight
+    is only used when no start weight is set.
+    """
+    s = goal_settings()
+    weighed = np.flatnonzero(~np.isnan(t["weight"]))
+    start_day = date.fromordinal(int(t["days"][weighed[0]])) if len(weighed) else today
+    start_wt = s["start_weight"]
+    if start_wt is None:
+        start_wt = float(t["weight"][weighed[0]]) if len(weighed) else 225.0
+    return start_day, start_wt, s["goal_date"] or today, s["goal_weight"] or 190.0
+
+
+def progress_summary(today: date) -> dict:
+    """Pace, expected weight and trend figures for the dashboard.
+
+    Start weight is the Settings one (see goal_line()); current weight is the
+    latest smoothed trend value, so one noisy weigh-in doesn't swing the pace.
+    The charts load their data from /series.json.
+    """
+    t = weight_trend()
+    log = get_day(today)
+    start_day, start_wt, goal_date, goal_wt = goal_line(t, today)
+    latest_wt = trend_at(t, "weight_trend", today)
+    current_wt = latest_wt if latest_wt is not None else start_wt
+
+    expected = expected_weight_on(today, start_day, start_wt, goal_date, goal_wt)
     # Pace percent: 100 = exactly on pace, >100 ahead, <100 behind
-    denom = (expected - start_wt) if expected != start_wt else -1.0
-    # use weight loss direction
-    target_loss_so_far = (start_wt - expected)
-    actual_loss_so_far = (start_wt - current_wt)
-    pace_pct = 0
+    target_loss_so_far = start_wt - expected
+    actual_loss_so_far = start_wt - current_wt
     if target_loss_so_far > 0:
         pace_pct = round((actual_loss_so_far / target_loss_so_far) * 100, 1)
     else:
         pace_pct = 100.0
 
+    return {
+        "log": log,
+        "pace_pct": pace_pct,
+        "expected_weight": round(expected, 1),
+        "current_weight": round(current_wt, 1),
+        "start_weight": round(start_wt, 1),
+        "goal_weight": round(goal_wt, 1),
+        "goal_date": goal_date,
+        **trend_summary(t, today, goal_wt),
+    }
+
+
+# Fingerprinted assets from build_assets.py; empty (CDN fallback) when unbuilt
+DIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "dist")
+try:
+    with open(os.path.join(DIST_DIR, "assets.json"), encoding="utf-8") as f:
+        _manifest = json.load(f)
+    ASSETS, ASSET_VERSION = _manifest["assets"], _manifest["version"]
+    IMAGES = _manifest.get("images", {})
+except FileNotFoundError:
+    ASSETS, ASSET_VERSION, IMAGES = {}, "dev", {}
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+@bp.app_template_global()
+def asset(name: str) -> str:
+    if name in ASSETS:
+        return url_for("main.built_asset", filename=ASSETS[name])
+    return url_for("static", filename=name)
+
+
+@bp.app_template_global()
+def has_asset(name: str) -> bool:
+    return name in ASSETS
+
+
+@bp.app_template_global()
+def picture(name: str, alt: str = "", sizes: str = "100vw", **attrs) -> Markup:
+    """<picture> with AVIF/WebP srcsets and intrinsic width/height for a
+    built image; a plain <img> of the original otherwise. Extra keyword
+    arguments become <img> attributes (class_ for class)."""
+    info = IMAGES.get(name)
+    img = {"src": asset(name), "alt": alt, "decoding": "async"}
+    if info:
+        img.update(width=info["width"], height=info["height"])
+    img.update({k.rstrip("_"): v for k, v in attrs.items()})
+    img_tag = Markup("<img {}>").format(
+        Markup(" ").join(Markup('{}="{}"').format(k, v) for k, v in img.items())
+    )
+    if not info:
+        return img_tag
+
+    sources = []
+    for fmt, variants in info["variants"].items():
+        srcset = ", ".join(f"{url_for('main.built_asset', filename=f)} {w}w" for w, f in variants)
+        sources.append(Markup('<source type="image/{}" srcset="{}" sizes="{}">').format(fmt, srcset, sizes))
+    return Markup("<picture>{}{}</picture>").format(Markup("").join(sources), img_tag)
+
+
+@bp.route("/assets/<path:filename>")
+def built_asset(filename):
+    # Precompressed variant if the client takes it; hashed names never change.
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding, suffix = None, ""
+    for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+        if enc in request.accept_encodings and os.path.isfile(os.path.join(DIST_DIR, filename + ext)):
+            encoding, suffix = enc, ext
+            break
+    resp = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    return resp
+
+
+BUILD_ID = ((os.getenv("RENDER_GIT_COMMIT") or "")[:12] or str(int(os.path.getmtime(__file__)))) + "." + ASSET_VERSION
+
+
+# --- Read cache -------------------------------------------------------------
+# Rendered GET pages and small computed values (the settings snapshot) are
+# cached under the DataVersion numbers they were built from. Writes already
+# bump exactly the keys they touch (_track_changes, touch_versions), so an
+# entry goes stale by never being asked for again and ages out of the LRU.
+#
+# Each process keeps an LRU with a TTL. With READ_CACHE_PATH set, processes
+# also share a SQLite file holding the entries and a copy of the version
+# rows; writers publish their new versions there after commit, so a repeat
+# read on any worker is answered without touching the main database. Version
+# rows copied from the database are re-read after READ_CACHE_CHECK_S, which
+# bounds staleness from writers running without the file. Values are plain
+# JSON (a page is its status, headers and body text), so nothing read back
+# from the shared file is ever executed.
+
+READ_CACHE_SIZE = env_int("READ_CACHE_SIZE", 256)  # entries per process; 0 = off
+READ_CACHE_TTL = env_int("READ_CACHE_TTL", 300)
+READ_CACHE_MAX_BYTES = env_int("READ_CACHE_MAX_BYTES", 512 * 1024)  # bigger pages aren't cached
+READ_CACHE_PATH = os.getenv("READ_CACHE_PATH")  # shared SQLite file; unset = per-process only
+READ_CACHE_CHECK_S = env_int("READ_CACHE_CHECK_S", 60)
+# Fetched along with every data page's own keys: the settings snapshot, the
+# weight trend and the meal search/plan libraries are read by most pages
+PREFETCH_VERSION_KEYS = ["settings", "weights", "weights-backfill", "meal-names", "saved-meals"]
+
+
+class LRUCache:
+    """Thread-safe LRU whose entries expire ttl seconds after being set."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size, self.ttl = size, ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is None:
+                return None
+            if hit[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, value):
+        if not self.size:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+read_cache = LRUCache(READ_CACHE_SIZE, READ_CACHE_TTL)
+_shared = {"pid": None, "conn": None, "sets": 0}
+_shared_lock = threading.Lock()
+
+
+def _shared_conn():
+    # One connection per process, opened after a gunicorn fork
+    if _shared["pid"] != os.getpid():
+        conn = sqlite3.connect(READ_CACHE_PATH, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions "
+            "(key TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at TEXT, checked REAL NOT NULL)"
+        )
+        _shared.update(pid=os.getpid(), conn=conn, sets=0)
+    return _shared["conn"]
+
+
+def shared_cache(fn):
+    """Run fn(conn) against the READ_CACHE_PATH file. None when there is no
+    file or it fails: the cache is an optimisation, never an error."""
+    if not READ_CACHE_PATH:
+        return None
+    try:
+        with _shared_lock:
+            return fn(_shared_conn())
+    except sqlite3.Error as e:
+        request_log.warning("read cache: %s", e)
+        return None
+
+
+def cache_get(kind: str, key: str):
+    if not READ_CACHE_SIZE:
+        return None
+    value = read_cache.get(key)
+    result = "local"
+    if value is None:
+        row = shared_cache(lambda c: c.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone())
+        try:
+            value = json.loads(row[0]) if row else None
+        except (TypeError, ValueError):
+            value = None  # not ours; rewritten on the next set
+        if value is not None:
+            result = "shared"
+            read_cache.set(key, value)
+        else:
+            result = "miss"
+    _count("fittrack_read_cache_total", (("kind", kind), ("result", result)))
+    return value
+
+
+def cache_set(key: str, value):
+    """Cache a JSON-serialisable value."""
+    if not READ_CACHE_SIZE:
+        return
+    read_cache.set(key, value)
+
+    def put(c):
+        c.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, json.dumps(value), time.time() + READ_CACHE_TTL))
+        _shared["sets"] += 1
+        if _shared["sets"] % max(READ_CACHE_SIZE, 1) == 0:
+            c.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+
+    shared_cache(put)
+
+
+def push_shared_versions(rows: dict):
+    """Record {key: (version, updated_at)} in the shared file. Versions only
+    move forward, so a reader's older copy can't undo a writer's bump."""
+    stamp = time.time()
+    shared_cache(lambda c: c.executemany(
+        "INSERT INTO versions VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+        "version = excluded.version, updated_at = excluded.updated_at, checked = excluded.checked "
+        "WHERE excluded.version >= versions.version",
+        [(k, v, t.isoformat() if t else None, stamp) for k, (v, t) in rows.items()],
+    ))
+
+
+def data_versions(keys) -> dict:
+    """{key: (version, updated_at)} for DataVersion keys; (0, None) if never
+    written. Remembered for the rest of the request (until a commit), and read
+    from the shared cache file when its copy is recent enough."""
+    memo = g.setdefault("data_versions", {}) if has_request_context() else {}
+    missing = [k for k in dict.fromkeys(keys) if k not in memo]
+    if missing:
+        def fresh(c):
+            marks = ",".join("?" * len(missing))
+            return c.execute(
+                f"SELECT key, version, updated_at FROM versions WHERE key IN ({marks}) AND checked > ?",
+                (*missing, time.time() - READ_CACHE_CHECK_S),
+            ).fetchall()
+
+        for k, v, t in shared_cache(fresh) or ():
+            memo[k] = (v, datetime.fromisoformat(t) if t else None)
+        missing = [k for k in missing if k not in memo]
+    if missing:
+        found = {
+            k: (v, t) for k, v, t in db.session.execute(
+                select(DataVersion.key, DataVersion.version, DataVersion.updated_at).where(DataVersion.key.in_(missing))
+            )
+        }
+        found = {k: found.get(k, (0, None)) for k in missing}
+        push_shared_versions(found)
+        memo.update(found)
+    return {k: memo[k] for k in keys}
+
+
+def conditional(keys=lambda **kw: ["global"]):
+    """Strong ETag/Last-Modified from DataVersion for a GET page.
+
+    Answers 304 from the version rows, before the view runs, and otherwise
+    serves the page from the read cache when one was rendered for the same
+    tag. Today's date and BUILD_ID are part of the tag so pages roll over at
+    midnight and on deploy.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            wanted = keys(**kwargs)
+            # Static pages (no keys) need no versions at all
+            found = data_versions(list(wanted) + PREFETCH_VERSION_KEYS) if wanted else {}
+            etag = "-".join([BUILD_ID, date.today().isoformat()] + [str(found[k][0]) for k in wanted])
+            stamps = [found[k][1] for k in wanted if found[k][1]]
+            last_modified = max(stamps).replace(microsecond=0) if stamps else None
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                resp = current_app.response_class(status=304)
+            else:
+                # The tag covers everything the page reads; the path covers its arguments
+                key = f"page:{etag}:{request.full_path}"
+                hit = cache_get("page", key)
+                if hit is not None:
+                    resp = current_app.response_class(hit["body"], status=hit["status"], headers=hit["headers"])
+                else:
+                    resp = current_app.make_response(view(*args, **kwargs))
+                    if resp.status_code == 200 and not resp.is_streamed:
+                        body = resp.get_data(as_text=True)
+                        if len(body) <= READ_CACHE_MAX_BYTES:
+                            cache_set(key, {
+                                "status": resp.status_code,
+                                "headers": {"Content-Type": resp.content_type},
+                                "body": body,
+                            })
+            resp.set_etag(etag)
+            if last_modified:
+                resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+        return wrapper
+    return decorator
+
+
+QUICK_ADD_SIZE = 6
+QUICK_ADD_DEFAULTS = [
+    {"label": "Protein Shake", "name": "Protein shake", "calories": 200, "protein_g": 30},
+    {"label": "Greek Yogurt Bowl", "name": "Greek yogurt + berries", "calories": 300, "protein_g": 35},
+    {"label": "Chicken Bowl", "name": "Chicken + veggies + rice (½ cup)", "calories": 500, "protein_g": 50},
+    {"label": "Tuna Pack", "name": "Tuna pack + apple", "calories": 250, "protein_g": 30},
+]
+
+
+@bp.route("/")
+@conditional()
+def dashboard():
+    today = date.today()
+    p = progress_summary(today)
+    log = p["log"]
+    meals = Meal.query.filter_by(day=today).order_by(Meal.created_at.desc()).all()
+
+    cal_delta = (log.calories_total or 0) - (log.cal_target or 0)
+    prot_delta = (log.protein_g_total or 0) - (log.prot_target or 0)
+
+    # The user's own top meals, topped up with the starter templates
     quick_add = [
-        {"label": "Protein Shake", "name": "Protein shake", "calories": 200, "protein_g": 30},
-        {"label": "Greek Yogurt Bowl", "name": "Greek yogurt + berries", "calories": 300, "protein_g": 35},
-        {"label": "Chicken Bowl", "name": "Chicken + veggies + rice (½ cup)", "calories": 500, "protein_g": 50},
-        {"label": "Tuna Pack", "name": "Tuna pack + apple", "calories": 250, "protein_g": 30},
+        {"label": f.name, "name": f.name, "calories": f.calories, "protein_g": f.protein_g}
+        for f in top_meals(QUICK_ADD_SIZE)
     ]
+    taken = {meal_key(q["name"]) for q in quick_add}
+    quick_add += [q for q in QUICK_ADD_DEFAULTS if meal_key(q["name"]) not in taken][:max(0, 4 - len(quick_add))]
 
     return render_template(
             "dashboard.html",
@@ -200,35 +1773,41 @@ def dashboard():
             cal_delta=cal_delta,
             prot_delta=prot_delta,
             score=compliance_score(log),
-            labels=labels,
-            weights=weights,
-            compliance=compliance,
-            goal_weights=goal_weights,
-            pace_pct=pace_pct,
-            expected_weight=round(expected,1),
-            current_weight=round(current_wt,1),
-            goal_date=s.goal_date,
-            start_weight=round(start_wt,1),
-            goal_weight=round(goal_wt,1),
+            pace_pct=p["pace_pct"],
+            expected_weight=p["expected_weight"],
+            current_weight=p["current_weight"],
+            goal_date=p["goal_date"],
+            start_weight=p["start_weight"],
+            goal_weight=p["goal_weight"],
+            rate_7=p["rate_7"],
+            rate_30=p["rate_30"],
+            projected_goal_date=p["projected_goal_date"],
             quick_add=quick_add,
+            streaks=streak_summary(today, top=1),
         )
 
 
-@app.route("/day/<dstr>")
+def url_day(dstr: str) -> date:
+    try:
+        return datetime.strptime(dstr, "%Y-%m-%d").date()
+    except ValueError:
+        abort(404)
+
+
+@bp.route("/day/<dstr>")
+# Keyed on the parsed day: strptime also takes 2026-1-5, writes bump day:2026-01-05
+@conditional(lambda dstr: [f"day:{url_day(dstr).isoformat()}", "all-days"])
 def day_view(dstr):
-    d = datetime.strptime(dstr, "%Y-%m-%d").date()
-    log = get_or_create_day(d)
-    recalc_totals(d)
-    log = DayLog.query.filter_by(day=d).first()
+    d = url_day(dstr)
+    if dstr != d.isoformat():
+        return redirect(url_for("main.day_view", dstr=d.isoformat()), 301)
+    log = get_day(d)
     meals = Meal.query.filter_by(day=d).order_by(Meal.created_at.desc()).all()
-    return render_template("day.html", day=d, log=log, meals=meals, score=compliance_score(log))
+    return render_template("day.html", day=d, log=log, meals=meals, score=compliance_score(log), plan=plan_for(d))
 
 
-@app.route("/day/update", methods=["POST"])
-def day_update():
-    d = datetime.strptime(request.form["day"], "%Y-%m-%d").date()
-    log = get_or_create_day(d)
-
+def day_fields_from_form(form) -> dict:
+    # Parsed DayLog fields from the day form; blank targets keep the current ones.
     def to_float(v):
         v = (v or "").strip()
         return float(v) if v else None
@@ -237,134 +1816,389 @@ def day_update():
         v = (v or "").strip()
         return int(v) if v else None
 
-    log.weight_am = to_float(request.form.get("weight_am"))
-    log.waist_in = to_float(request.form.get("waist_in"))
-    log.walking_miles = to_float(request.form.get("walking_miles"))
-    log.active_calories = to_int(request.form.get("active_calories"))
+    fields = {
+        "weight_am": to_float(form.get("weight_am")),
+        "waist_in": to_float(form.get("waist_in")),
+        "walking_miles": to_float(form.get("walking_miles")),
+        "active_calories": to_int(form.get("active_calories")),
+        "walk_done": form.get("walk_done") == "on",
+        "lift_done": form.get("lift_done") == "on",
+        "if_done": form.get("if_done") == "on",
+        "rings_closed": form.get("rings_closed") == "on",
+        "cal_target": to_int(form.get("cal_target")),
+        "prot_target": to_int(form.get("prot_target")),
+        "notes": form.get("notes") or None,
+    }
+    for k in ("cal_target", "prot_target"):
+        if not fields[k]:
+            del fields[k]
+    return fields
+
+
+def update_day(log: DayLog, fields: dict):
+    for k, v in fields.items():
+        setattr(log, k, v)
+
+
+def meal_from_form(d: date, form, default_name=None):
+    # None when the form has no name and there's no fallback.
+    name = (form.get("name") or "").strip() or default_name
+    if not name:
+        return None
 
-    log.walk_done = request.form.get("walk_done") == "on"
-    log.lift_done = request.form.get("lift_done") == "on"
-    log.if_done = request.form.get("if_done") == "on"
-    log.rings_closed = request.form.get("rings_closed") == "on"
+    def to_int(v):
+        v = (v or "").strip()
+        return int(v) if v else None
 
-    log.cal_target = to_int(request.form.get("cal_target")) or log.cal_target
-    log.prot_target = to_int(request.form.get("prot_target")) or log.prot_target
+    return Meal(
+        day=d,
+        time=(form.get("time") or "").strip() or None,
+        name=name[:120],
+        calories=to_int(form.get("calories")),
+        protein_g=to_int(form.get("protein_g")),
+    )
 
-    log.notes = request.form.get("notes") or None
 
-    db.session.commit()
-    recalc_totals(d)
-    return redirect(url_for("day_view", dstr=d.isoformat()))
+def meal_from_saved(sm: SavedMeal, d: date, form) -> Meal:
+    return Meal(
+        day=d,
+        time=(form.get("time") or "").strip() or None,
+        name=sm.name,
+        calories=sm.calories,
+        protein_g=sm.protein_g,
+    )
 
 
-@app.route("/meal/add", methods=["POST"])
-def meal_add():
-    d = datetime.strptime(request.form["day"], "%Y-%m-%d").date()
-    name = (request.form.get("name") or "").strip()
-    if not name:
-        return redirect(url_for("day_view", dstr=d.isoformat()))
+def workout_from_form(d: date, form):
+    wtype = (form.get("workout_type") or "").strip()
+    if not wtype:
+        return None
+    return WorkoutLog(
+        day=d,
+        workout_type=wtype[:80],
+        minutes=int(form.get("minutes") or 0),
+        calories=int(form.get("calories") or 0),
+        notes=(form.get("notes") or "").strip()[:250],
+    )
 
 
-@app.route("/meal/quick_add", methods=["POST"])
-def meal_quick_add():
+def day_snapshot(log: DayLog, meals) -> dict:
+    # Plain values, so they survive the commit expiring the ORM objects
+    return {
+        "day": log.day.isoformat(),
+        "score": compliance_score(log),
+        "calories_total": log.calories_total or 0,
+        "protein_g_total": log.protein_g_total or 0,
+        "cal_target": log.cal_target,
+        "prot_target": log.prot_target,
+        "meals": [
+            {"id": m.id, "time": m.time, "name": m.name, "calories": m.calories, "protein_g": m.protein_g}
+            for m in meals
+        ],
+    }
+
+
+def commit_day(d: date, log: DayLog = None):
+    """Commit a write to day d and answer it.
+
+    Plain form posts get redirected to the day page. fetch() calls send
+    X-Fragment and get only the score/totals and meal list back: the
+    day_fragment.html pieces to swap in, or JSON if they accept that. The
+    day is read inside the write transaction, so answering costs one meals
+    query and no second round trip.
+    """
+    if not request.headers.get("X-Fragment"):
+        db.session.commit()
+        return redirect(url_for("main.day_view", dstr=d.isoformat()))
+    meals = Meal.query.filter_by(day=d).order_by(Meal.created_at.desc()).all()
+    snap = day_snapshot(log or get_day(d), meals)
+    db.session.commit()
+    if request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json":
+        return jsonify(snap)
+    return render_template("day_fragment.html", log=snap, meals=snap["meals"], score=snap["score"])
+
+
+@bp.route("/day/update", methods=["POST"])
+def day_update():
     d = datetime.strptime(request.form["day"], "%Y-%m-%d").date()
+    fields = day_fields_from_form(request.form)
+    log = get_or_create_day(d)
+    update_day(log, fields)
+    return commit_day(d, log)
 
-    def to_int(v):
-        v = (v or "").strip()
-        return int(v) if v else None
 
-    m = Meal(
-        day=d,
-        time=(request.form.get("time") or "").strip() or None,
-        name=(request.form.get("name") or "Quick add").strip(),
-        calories=to_int(request.form.get("calories")),
-        protein_g=to_int(request.form.get("protein_g")),
-    )
+@bp.route("/meal/add", methods=["POST"])
+def meal_add():
+    d = datetime.strptime(request.form["day"], "%Y-%m-%d").date()
+    m = meal_from_form(d, request.form)
+    if not m:
+        return commit_day(d)
     db.session.add(m)
-    db.session.commit()
-    recalc_totals(d)
-    return redirect(url_for("day_view", dstr=d.isoformat()))
+    return commit_day(d, add_meal_totals(d, m.calories, m.protein_g))
 
-    def to_int(v):
-        v = (v or "").strip()
-        return int(v) if v else None
 
-    m = Meal(
-        day=d,
-        time=(request.form.get("time") or "").strip() or None,
-        name=name,
-        calories=to_int(request.form.get("calories")),
-        protein_g=to_int(request.form.get("protein_g")),
-    )
+@bp.route("/meal/quick_add", methods=["POST"])
+def meal_quick_add():
+    d = datetime.strptime(request.form["day"], "%Y-%m-%d").date()
+    m = meal_from_form(d, request.form, default_name="Quick add")
     db.session.add(m)
-    db.session.commit()
-    recalc_totals(d)
-    return redirect(url_for("day_view", dstr=d.isoformat()))
+    return commit_day(d, add_meal_totals(d, m.calories, m.protein_g))
 
 
-@app.route("/meal/delete/<int:mid>", methods=["POST"])
+@bp.route("/meal/delete/<int:mid>", methods=["POST"])
 def meal_delete(mid):
     m = Meal.query.get_or_404(mid)
     d = m.day
     db.session.delete(m)
-    db.session.commit()
-    recalc_totals(d)
-    return redirect(url_for("day_view", dstr=d.isoformat()))
+    return commit_day(d, add_meal_totals(d, -(m.calories or 0), -(m.protein_g or 0)))
 
 
 
-@app.route("/weekly")
+@bp.route("/weekly")
+@conditional()
 def weekly():
     today = date.today()
-    start = today - timedelta(days=90)
-    logs = DayLog.query.filter(DayLog.day >= start).order_by(DayLog.day.asc()).all()
+    n_weeks = min(max(request.args.get("weeks", 16, type=int), 1), 520)
+    rows = (
+        WeeklyRollup.query.filter(WeeklyRollup.week_start <= today)
+        .order_by(WeeklyRollup.week_start.desc())
+        .limit(n_weeks)
+        .all()
+    )
 
-    # build weekly buckets (Mon-Sun)
-    buckets = {}
-    for l in logs:
-        wk_start = l.day - timedelta(days=l.day.weekday())
-        buckets.setdefault(wk_start, []).append(l)
+    def avg(total, n, ndigits=None):
+        return round(total / n, ndigits) if n else None
 
     weeks = []
-    for wk in sorted(buckets.keys(), reverse=True)[:16]:
-        items = buckets[wk]
-        wts = [x.weight_am for x in items if x.weight_am is not None]
-        waists = [x.waist_in for x in items if x.waist_in is not None]
-        cals = [x.calories_total for x in items if x.calories_total is not None]
-        prots = [x.protein_g_total for x in items if x.protein_g_total is not None]
-        comp = [compliance_score(x) for x in items]
-        miles = [x.walking_miles for x in items if x.walking_miles is not None]
-        active = [x.active_calories for x in items if x.active_calories is not None]
-        rings = [1 for x in items if x.rings_closed]
+    for r in rows:
         weeks.append({
-            "week_start": wk,
-            "avg_weight": round(sum(wts)/len(wts), 1) if wts else None,
-            "avg_waist": round(sum(waists)/len(waists), 1) if waists else None,
-            "avg_cals": round(sum(cals)/len(cals)) if cals else None,
-            "avg_prot": round(sum(prots)/len(prots)) if prots else None,
-            "avg_miles": round(sum(miles)/len(miles), 2) if miles else None,
-            "avg_active": round(sum(active)/len(active)) if active else None,
-            "rings_pct": round((sum(rings)/len(items))*100, 0) if items else None,
-            "avg_comp": round(sum(comp)/len(comp), 2) if comp else None,
+            "week_start": r.week_start,
+            "avg_weight": avg(r.weight_sum, r.weight_n, 1),
+            "avg_waist": avg(r.waist_sum, r.waist_n, 1),
+            "avg_cals": avg(r.cal_sum, r.cal_n),
+            "avg_prot": avg(r.prot_sum, r.prot_n),
+            "avg_miles": avg(r.miles_sum, r.miles_n, 2),
+            "avg_active": avg(r.active_sum, r.active_n),
+            "rings_pct": round((r.rings_n / r.days) * 100, 0) if r.days else None,
+            "avg_comp": avg(r.comp_sum, r.days, 2),
         })
 
-    # waist trend chart (last 60 days)
-    start2 = today - timedelta(days=60)
-    logs2 = DayLog.query.filter(DayLog.day >= start2).order_by(DayLog.day.asc()).all()
-    labels = [l.day.strftime("%b %d") for l in logs2]
-    waist = [l.waist_in for l in logs2]
-    miles = [l.walking_miles for l in logs2]
+    goal_wt = goal_settings()["goal_weight"] or 190.0
+    return render_template(
+        "weekly.html",
+        weeks=weeks,
+        n_weeks=n_weeks,
+        trend=trend_summary(weight_trend(), today, goal_wt),
+        goal_weight=goal_wt,
+    )
+
 
-    return render_template("weekly.html", weeks=weeks, labels=labels, waist=waist, miles=miles)
+STREAK_MIN_SCORE = 4
+STREAK_TOP = 5
 
 
+def streak_summary(today: date, min_score: int = STREAK_MIN_SCORE, top: int = STREAK_TOP) -> dict:
+    """Runs of consecutive logged days scoring >= min_score, plus this month's
+    compliance, all computed in SQL from the stored scores.
 
-@app.route("/settings")
+    Gaps-and-islands: within a run, day number minus row number is constant,
+    so grouping on it yields one row per streak. A run still counts as
+    current if it ended yesterday (today isn't over yet).
+    """
+    hits = (
+        select(
+            DayLog.day,
+            (day_number_expr(DayLog.day) - func.row_number().over(order_by=DayLog.day)).label("grp"),
+        )
+        .where(DayLog.compliance >= min_score, DayLog.day <= today)
+        .subquery()
+    )
+    runs = select(
+        func.min(hits.c.day).label("start"),
+        func.max(hits.c.day).label("end"),
+        func.count().label("days"),
+    ).group_by(hits.c.grp).subquery()
+
+    def streak(r):
+        return {"start": r.start.isoformat(), "end": r.end.isoformat(), "days": r.days}
+
+    session = db.session
+    current = session.execute(
+        select(runs).where(runs.c.end >= today - timedelta(days=1)).order_by(runs.c.end.desc()).limit(1)
+    ).first()
+    longest = session.execute(select(runs).order_by(runs.c.days.desc(), runs.c.end.desc()).limit(top)).all()
+
+    month_start = today.replace(day=1)
+    by_score = dict(
+        session.execute(
+            select(DayLog.compliance, func.count())
+            .where(DayLog.day.between(month_start, today))
+            .group_by(DayLog.compliance)
+        ).all()
+    )
+    logged = sum(by_score.values())
+    compliant = sum(n for score, n in by_score.items() if score >= min_score)
+    return {
+        "min_score": min_score,
+        "current": streak(current) if current else None,
+        "longest": [streak(r) for r in longest],
+        "month": {
+            "start": month_start.isoformat(),
+            "days": (today - month_start).days + 1,
+            "logged": logged,
+            "compliant": compliant,
+            "pct": round(compliant / logged * 100, 1) if logged else None,
+            "scores": {str(k): by_score.get(k, 0) for k in range(6)},
+        },
+    }
+
+
+@bp.route("/streaks.json")
+@conditional()
+def streaks():
+    """Streak analytics: ?min=4 (score threshold, 1-5) &top=5 (longest runs)."""
+    min_score = min(max(request.args.get("min", STREAK_MIN_SCORE, type=int), 1), 5)
+    top = min(max(request.args.get("top", STREAK_TOP, type=int), 1), 50)
+    return jsonify(streak_summary(date.today(), min_score, top))
+
+
+# metric -> (DayLog column, SQL expression or weight_trend() series; default downsampling)
+SERIES = {
+    "weight": (DayLog.weight_am, "lttb"),
+    "waist": (DayLog.waist_in, "lttb"),
+    "miles": (DayLog.walking_miles, "mean"),
+    "calories": (DayLog.calories_total, "mean"),
+    "protein": (DayLog.protein_g_total, "mean"),
+    "compliance": (DayLog.compliance, "mean"),
+    "weight_trend": ("weight_trend", "lttb"),
+    "waist_trend": ("waist_trend", "lttb"),
+    "goal": ("goal", "lttb"),
+}
+SERIES_POINTS = 300
+SERIES_MAX_POINTS = 2000
+RANGE_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+
+def parse_range(value: str, today: date):
+    # "30d", "12w", "6m", "1y" -> first day; "all" -> None
+    value = (value or "30d").strip().lower()
+    if value == "all":
+        return None
+    n, unit = value[:-1], value[-1:]
+    if not n.isdigit() or unit not in RANGE_UNITS or not 0 < int(n) * RANGE_UNITS[unit] <= 36500:
+        raise ValueError(f"bad range: {value!r}")
+    return today - timedelta(days=int(n) * RANGE_UNITS[unit] - 1)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int):
+    """Largest-Triangle-Three-Buckets: n points that keep the line's shape."""
+    if len(x) <= n or n < 3:
+        return x, y
+    # n - 2 buckets over the middle points, plus the last point as a final bucket
+    edges = np.append(np.linspace(1, len(x) - 1, n - 1).astype(np.int64), len(x))
+    cx = np.concatenate([[0], np.cumsum(x, dtype=float)])
+    cy = np.concatenate([[0], np.cumsum(y, dtype=float)])
+    sizes = np.diff(edges)
+    avg_x = (cx[edges[1:]] - cx[edges[:-1]]) / sizes
+    avg_y = (cy[edges[1:]] - cy[edges[:-1]]) / sizes
+
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, len(x) - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def bucket_mean(x: np.ndarray, y: np.ndarray, n: int, start: int, end: int):
+    """Mean of each of n equal-width day buckets over [start, end]; empty
+    buckets are dropped."""
+    if len(x) <= n:
+        return x, y
+    bucket = np.minimum(((x - start) * n) // max(end - start + 1, 1), n - 1)
+    counts = np.bincount(bucket, minlength=n)
+    has = counts > 0
+    mean_x = np.bincount(bucket, weights=x, minlength=n)[has] / counts[has]
+    mean_y = np.bincount(bucket, weights=y, minlength=n)[has] / counts[has]
+    return np.rint(mean_x).astype(np.int64), mean_y
+
+
+def series_points(t: dict, metric: str, start, end: date, points: int, mode: str):
+    """Downsampled (ordinal days, values) for one metric over [start, end];
+    t is weight_trend()."""
+    source, default_mode = SERIES[metric]
+    mode = mode or default_mode
+    if source == "goal":
+        start_day, start_wt, goal_date, goal_wt = goal_line(t, end)
+        first = (start or start_day).toordinal()
+        x = np.unique(np.linspace(first, end.toordinal(), min(points, end.toordinal() - first + 1)).astype(np.int64))
+        # expected_weight_on(), vectorized
+        days_total = max((goal_date - start_day).days, 1)
+        done = np.clip(x - start_day.toordinal(), 0, days_total)
+        return x, start_wt + done / days_total * (goal_wt - start_wt)
+    if isinstance(source, str):
+        lo = 0 if start is None else int(np.searchsorted(t["days"], start.toordinal()))
+        hi = int(np.searchsorted(t["days"], end.toordinal(), side="right"))
+        x, y = t["days"][lo:hi], t[source][lo:hi]
+        ok = ~np.isnan(y)
+        x, y = x[ok], y[ok]
+    else:
+        q = select(DayLog.day, source).where(source.isnot(None), DayLog.day <= end).order_by(DayLog.day)
+        if start is not None:
+            q = q.where(DayLog.day >= start)
+        rows = db.session.execute(q).all()
+        x = np.fromiter((d.toordinal() for d, _ in rows), dtype=np.int64, count=len(rows))
+        y = np.fromiter((v for _, v in rows), dtype=float, count=len(rows))
+    if not len(x):
+        return x, y
+    if mode == "mean":
+        return bucket_mean(x, y, points, int(x[0]) if start is None else start.toordinal(), end.toordinal())
+    return lttb(x, y, points)
+
+
+@bp.route("/series.json")
+@conditional()
+def series():
+    """Chart data: ?metrics=weight,weight_trend&range=1y&points=300[&mode=lttb|mean].
+
+    Reads columns only and returns at most `points` points per metric,
+    downsampled with LTTB (lines) or equal-width bucket means (bars).
+    """
+    today = date.today()
+    metrics = [m for m in request.args.get("metrics", "weight").split(",") if m]
+    mode = request.args.get("mode") or None
+    try:
+        start = parse_range(request.args.get("range"), today)
+        points = min(max(int(request.args.get("points", SERIES_POINTS)), 3), SERIES_MAX_POINTS)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    unknown = [m for m in metrics if m not in SERIES]
+    if unknown or mode not in (None, "lttb", "mean"):
+        return jsonify(error=f"unknown metric or mode: {', '.join(unknown) or mode}"), 400
+
+    t = weight_trend()
+    out = {}
+    for metric in metrics:
+        x, y = series_points(t, metric, start, today, points, mode)
+        out[metric] = {
+            "x": [date.fromordinal(int(d)).isoformat() for d in x],
+            "y": [round(float(v), 2) for v in y],
+        }
+    return jsonify(start=start.isoformat() if start else None, end=today.isoformat(), series=out)
+
+
+@bp.route("/settings")
+@conditional()
 def settings():
     s = get_settings()
-    return render_template("settings.html", s=s)
+    imported = request.args.get("imported", type=int)
+    return render_template("settings.html", s=s, imported=imported, imported_kind=request.args.get("kind"))
 
-@app.route("/settings/update", methods=["POST"])
+@bp.route("/settings/update", methods=["POST"])
 def settings_update():
     s = get_settings()
     def to_float(v):
@@ -380,21 +2214,22 @@ def settings_update():
     if gd:
         s.goal_date = gd
     db.session.commit()
-    return redirect(url_for("settings"))
+    return redirect(url_for("main.settings"))
 
 
 
 
-@app.route("/saved")
+@bp.route("/saved")
+@conditional()
 def saved_meals():
     meals = SavedMeal.query.order_by(SavedMeal.created_at.desc()).all()
     return render_template("saved.html", meals=meals, today=date.today())
 
-@app.route("/saved/add", methods=["POST"])
+@bp.route("/saved/add", methods=["POST"])
 def saved_add():
     name = (request.form.get("name") or "").strip()
     if not name:
-        return redirect(url_for("saved_meals"))
+        return redirect(url_for("main.saved_meals"))
 
     def to_int(v):
         v = (v or "").strip()
@@ -407,84 +2242,551 @@ def saved_add():
     )
     db.session.add(sm)
     db.session.commit()
-    return redirect(url_for("saved_meals"))
+    return redirect(url_for("main.saved_meals"))
 
-@app.route("/saved/delete/<int:sid>", methods=["POST"])
+@bp.route("/saved/delete/<int:sid>", methods=["POST"])
 def saved_delete(sid):
     sm = SavedMeal.query.get_or_404(sid)
     db.session.delete(sm)
     db.session.commit()
-    return redirect(url_for("saved_meals"))
+    return redirect(url_for("main.saved_meals"))
 
-@app.route("/saved/log/<int:sid>", methods=["POST"])
+@bp.route("/saved/log/<int:sid>", methods=["POST"])
 def saved_log(sid):
     sm = SavedMeal.query.get_or_404(sid)
     d = datetime.strptime(request.form.get("day") or date.today().isoformat(), "%Y-%m-%d").date()
-    m = Meal(
-        day=d,
-        time=(request.form.get("time") or "").strip() or None,
-        name=sm.name,
-        calories=sm.calories,
-        protein_g=sm.protein_g,
-    )
+    m = meal_from_saved(sm, d, request.form)
     db.session.add(m)
+    return commit_day(d, add_meal_totals(d, m.calories, m.protein_g))
+
+
+SYNC_MAX_OPS = 500
+SYNC_KEEP_DAYS = 30
+
+
+def apply_sync_op(kind: str, data, meal_days: set):
+    """Apply one queued form post. Raises ValueError/LookupError before
+    touching the session if the op is invalid."""
+    d = datetime.strptime(data.get("day") or date.today().isoformat(), "%Y-%m-%d").date()
+    if kind in ("meal_add", "meal_quick_add"):
+        m = meal_from_form(d, data, default_name="Quick add" if kind == "meal_quick_add" else None)
+        if not m:
+            raise ValueError("name is required")
+        db.session.add(m)
+        meal_days.add(d)
+    elif kind == "saved_log":
+        sm = db.session.get(SavedMeal, int(data.get("sid") or 0))
+        if not sm:
+            raise LookupError("saved meal not found")
+        db.session.add(meal_from_saved(sm, d, data))
+        meal_days.add(d)
+    elif kind == "day_update":
+        fields = day_fields_from_form(data)
+        update_day(get_or_create_day(d), fields)
+    elif kind == "workout_add":
+        w = workout_from_form(d, data)
+        if not w:
+            raise ValueError("workout_type is required")
+        db.session.add(w)
+    else:
+        raise ValueError(f"unknown op type: {kind}")
+
+
+@bp.route("/sync", methods=["POST"])
+def sync():
+    """Apply a batch of queued offline writes in one transaction.
+
+    Body: {"ops": [{"id": "<client id>", "type": "meal_add", "data": {...form fields}}]}.
+    Ops whose id was already applied are reported as duplicates, so a
+    retried flush is harmless. Meal totals are recomputed once per day.
+
+    Ids are claimed up front with INSERT ... ON CONFLICT DO NOTHING
+    RETURNING: an overlapping flush of the same ops (a second tab, a retry
+    racing the first request) waits on those rows and then gets none of
+    them back. Claims of ops that fail are released.
+    """
+    payload = request.get_json(silent=True) or {}
+    ops = payload.get("ops")
+    if not isinstance(ops, list) or not 1 <= len(ops) <= SYNC_MAX_OPS:
+        return jsonify(error=f"expected 1-{SYNC_MAX_OPS} ops"), 400
+
+    ids = {}
+    for op in ops:
+        if isinstance(op, dict) and op.get("id"):
+            ids.setdefault(str(op["id"])[:64], str(op.get("type") or "")[:32])
+    claimed = set(db.session.execute(
+        dialect_insert(SyncOp).on_conflict_do_nothing(index_elements=["id"]).returning(SyncOp.id),
+        [{"id": oid, "kind": kind} for oid, kind in ids.items()],
+    ).scalars()) if ids else set()
+    applied, duplicate, errors, failed = [], [], [], []
+    meal_days = set()
+    for op in ops:
+        if not isinstance(op, dict) or not op.get("id"):
+            errors.append({"id": None, "error": "missing id"})
+            continue
+        oid, kind = str(op["id"])[:64], str(op.get("type") or "")
+        if oid not in claimed:
+            duplicate.append(oid)
+            continue
+        claimed.discard(oid)  # a repeat later in this batch is a duplicate
+        data = op.get("data") if isinstance(op.get("data"), dict) else {}
+        data = {k: ("" if v is None else str(v)) for k, v in data.items()}
+        try:
+            apply_sync_op(kind, data, meal_days)
+        except (ValueError, LookupError) as e:
+            errors.append({"id": oid, "error": str(e)})
+            failed.append(oid)
+            continue
+        applied.append(oid)
+
+    if failed:
+        db.session.execute(delete(SyncOp).where(SyncOp.id.in_(failed)))
+    db.session.flush()
+    rebuild_totals(db.session, meal_days)
+    db.session.execute(
+        delete(SyncOp).where(SyncOp.applied_at < datetime.utcnow() - timedelta(days=SYNC_KEEP_DAYS))
+    )
     db.session.commit()
-    recalc_totals(d)
-    return redirect(url_for("day_view", dstr=d.isoformat()))
+    return jsonify(applied=applied, duplicate=duplicate, errors=errors)
+
+
+# --- Activity ingest ----------------------------------------------------------
+# POST /ingest takes JSON lines of activity and workout samples from a phone
+# shortcut or device bridge. Valid samples go on an in-process queue and the
+# request returns 202; a background thread (one per process, like the
+# metrics flusher) waits up to INGEST_FLUSH_MS for more, folds the batch to
+# one UPDATE per day plus one multi-row workout INSERT, and commits it all
+# in a single transaction. Sample ids are claimed in sync_ops, so resends
+# and retries apply once.
+
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")  # if set, required as a Bearer token
+INGEST_FLUSH_MS = env_int("INGEST_FLUSH_MS", 2000)
+INGEST_BATCH = 5000  # samples per transaction
+INGEST_MAX_LINES = 10000  # per request
+INGEST_QUEUE_MAX = env_int("INGEST_QUEUE_MAX", 1000)  # pending requests before 503
+INGEST_WAIT_S = 30
+# Largest accepted value per numeric sample field; anything above is a bad
+# reading (and could overflow the INTEGER columns)
+INGEST_LIMITS = {"active_calories": 20000, "walking_miles": 200, "minutes": 1440, "calories": 20000}
+
+_ingest_queue = queue.Queue(maxsize=INGEST_QUEUE_MAX)
+_ingest_lock = threading.Lock()  # held while a batch is being written
+_ingest_pid = None
+_ingest_app = None  # the app the drainer writes through
+
+
+def parse_sample(obj) -> dict:
+    """One validated sample; raises ValueError.
+
+    activity: {"id", "type": "activity", "day", "active_calories",
+    "walking_miles", "rings_closed", "replace"}. Calories and miles add to
+    the day unless "replace" is true, in which case they are the day's
+    totals so far. workout: {"id", "type": "workout", "day",
+    "workout_type", "minutes", "calories", "notes"}. "day" defaults to today.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("expected an object")
+    sid = str(obj.get("id") or "").strip()
+    if not sid or len(sid) > 64:
+        raise ValueError("id is required (at most 64 characters)")
+    try:
+        d = date.fromisoformat(obj["day"]) if obj.get("day") else date.today()
+    except (TypeError, ValueError):
+        raise ValueError("day must be YYYY-MM-DD") from None
+
+    def number(key, kind):
+        v = obj.get(key)
+        if v is None:
+            return None
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            raise ValueError(f"{key} must be a number")
+        if not 0 <= v <= INGEST_LIMITS[key]:
+            raise ValueError(f"{key} must be between 0 and {INGEST_LIMITS[key]}")
+        return kind(v)
+
+    kind = obj.get("type")
+    if kind == "activity":
+        sample = {
+            "active_calories": number("active_calories", int),
+            "walking_miles": number("walking_miles", float),
+            "rings_closed": obj.get("rings_closed"),
+            "replace": bool(obj.get("replace")),
+        }
+        if sample["rings_closed"] is not None and not isinstance(sample["rings_closed"], bool):
+            raise ValueError("rings_closed must be true or false")
+        if all(sample[k] is None for k in ("active_calories", "walking_miles", "rings_closed")):
+            raise ValueError("no activity fields")
+    elif kind == "workout":
+        wtype = str(obj.get("workout_type") or "").strip()
+        if not wtype:
+            raise ValueError("workout_type is required")
+        sample = {
+            "workout_type": wtype[:80],
+            "minutes": number("minutes", int) or 0,
+            "calories": number("calories", int) or 0,
+            "notes": str(obj.get("notes") or "").strip()[:250],
+        }
+    else:
+        raise ValueError("type must be activity or workout")
+    return {"id": sid, "type": kind, "day": d, **sample}
+
+
+def coalesce_activity(samples) -> dict:
+    """day -> {field: (set, add)} from activity samples in arrival order."""
+    days = {}
+    for s in samples:
+        fields = days.setdefault(s["day"], {})
+        for key in ("active_calories", "walking_miles"):
+            if s[key] is None:
+                continue
+            base, add = fields.get(key, (None, 0))
+            fields[key] = (s[key], 0) if s["replace"] else (base, add + s[key])
+        if s["rings_closed"] is not None:
+            fields["rings_closed"] = (s["rings_closed"], 0)
+    return days
+
+
+def apply_samples(session, samples) -> set:
+    """Write a batch of parsed samples in one transaction; returns the ids
+    applied (ids already seen are skipped)."""
+    seen, unique = set(), []
+    for s in samples:
+        if s["id"] not in seen:
+            seen.add(s["id"])
+            unique.append(s)
+    if not unique:
+        return set()
+    claimed = set(session.execute(
+        dialect_insert(SyncOp).on_conflict_do_nothing(index_elements=["id"]).returning(SyncOp.id),
+        [{"id": s["id"], "kind": f"ingest:{s['type']}"} for s in unique],
+    ).scalars())
+    samples = [s for s in unique if s["id"] in claimed]
+
+    activity = coalesce_activity(s for s in samples if s["type"] == "activity")
+    if activity:
+        have = set(session.scalars(select(DayLog.day).where(DayLog.day.in_(activity))))
+        missing = sorted(set(activity) - have)
+        if missing:
+            targets = default_targets(session, missing)
+            missing = [
+                {"day": d, "cal_target": targets[d][0], "prot_target": targets[d][1],
+                 "calories_total": 0, "protein_g_total": 0}
+                for d in missing
+            ]
+            session.execute(dialect_insert(DayLog).on_conflict_do_nothing(index_elements=["day"]), missing)
+
+        def summed(col, kind):
+            # set IS NULL AND add IS NULL keeps the column as it is (NULL stays NULL)
+            base, add = db.bindparam(f"{col.key}_set", type_=kind), db.bindparam(f"{col.key}_add", type_=kind)
+            return case(
+                (db.and_(base.is_(None), add.is_(None)), col),
+                else_=func.coalesce(base, col, 0) + func.coalesce(add, 0),
+            )
+
+        params = []
+        for d, fields in activity.items():
+            p = {"b_day": d, "rings_closed_set": fields.get("rings_closed", (None, 0))[0]}
+            for key in ("active_calories", "walking_miles"):
+                base, add = fields.get(key, (None, None))
+                p[f"{key}_set"], p[f"{key}_add"] = base, (add or None)
+            params.append(p)
+        session.execute(
+            update(DayLog.__table__)
+            .where(DayLog.day == db.bindparam("b_day"))
+            .values(
+                active_calories=summed(DayLog.active_calories, db.Integer),
+                walking_miles=summed(DayLog.walking_miles, db.Float),
+                rings_closed=func.coalesce(db.bindparam("rings_closed_set", type_=db.Boolean), DayLog.rings_closed),
+            ),
+            params,
+        )
+        refresh_weekly_rollups(session, {week_start_of(d) for d in activity})
+
+    workouts = [
+        {k: s[k] for k in ("day", "workout_type", "minutes", "calories", "notes")}
+        for s in samples if s["type"] == "workout"
+    ]
+    if workouts:
+        session.execute(insert(WorkoutLog), workouts)
+
+    touched = set(activity) | {w["day"] for w in workouts}
+    if touched:
+        touch_versions(session, "global", *day_keys(touched))
+    return claimed
+
+
+def _write_samples(samples):
+    """Apply and commit samples in one transaction; the ids applied, or
+    None if it failed (rolled back and logged)."""
+    try:
+        with _ingest_app.app_context():
+            applied = apply_samples(db.session, samples)
+            db.session.commit()
+            return applied
+    except Exception:
+        request_log.exception("ingest batch of %d samples failed", len(samples))
+        return None
+
+
+def _drain_ingest(items):
+    """Write queued requests [(samples, waiter)] as one batch. If the batch
+    fails, each request is retried in its own transaction so one request's
+    bad data can't drop the others' samples."""
+    with _ingest_lock:
+        applied = _write_samples([s for batch, _ in items for s in batch])
+        if applied is None and len(items) > 1:
+            results = [_write_samples(batch) for batch, _ in items]
+        else:
+            results = [applied] * len(items)
+    for (batch, waiter), applied in zip(items, results):
+        for s in batch:
+            outcome = "failed" if applied is None else ("applied" if s["id"] in applied else "duplicate")
+            _count("fittrack_ingest_samples_total", (("type", s["type"]), ("outcome", outcome)))
+        if waiter is not None:
+            waiter["applied"] = applied
+            waiter["done"].set()
+
+
+def _start_ingest_drain():
+    """Start this process's queue drainer (after fork, as for metrics)."""
+    global _ingest_pid, _ingest_app
+    if _ingest_pid == os.getpid():
+        return
+    _ingest_pid = os.getpid()
+    _ingest_app = current_app._get_current_object()
+
+    def loop():
+        while True:
+            items = [_ingest_queue.get()]
+            n = len(items[0][0])
+            deadline = time.monotonic() + INGEST_FLUSH_MS / 1000
+            while n < INGEST_BATCH:
+                try:
+                    items.append(_ingest_queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+                n += len(items[-1][0])
+            _drain_ingest(items)
+
+    threading.Thread(target=loop, name="ingest-drain", daemon=True).start()
+
+
+@atexit.register
+def _drain_ingest_on_exit():
+    # Worker shutdown: write whatever is still queued
+    items = []
+    while True:
+        try:
+            items.append(_ingest_queue.get_nowait())
+        except queue.Empty:
+            break
+    if items:
+        _drain_ingest(items)
+
+
+@bp.route("/ingest", methods=["POST"])
+def ingest():
+    """Queue a batch of JSON-lines samples (see parse_sample).
+
+    202 with the number queued and per-line errors; invalid lines are
+    skipped. ?wait=1 blocks until the batch is written and reports which
+    ids were applied and which were duplicates.
+    """
+    if INGEST_TOKEN and request.headers.get("Authorization") != f"Bearer {INGEST_TOKEN}":
+        return jsonify(error="unauthorized"), 401
+    samples, errors = [], []
+    for i, line in enumerate(io.TextIOWrapper(request.stream, encoding="utf-8"), 1):
+        if i > INGEST_MAX_LINES:
+            return jsonify(error=f"at most {INGEST_MAX_LINES} lines per request"), 413
+        if not line.strip():
+            continue
+        try:
+            samples.append(parse_sample(json.loads(line)))
+        except ValueError as e:
+            errors.append({"line": i, "error": str(e)})
+    for e in errors:
+        _count("fittrack_ingest_samples_total", (("type", "-"), ("outcome", "rejected")))
+    if not samples:
+        return jsonify(queued=0, errors=errors), 400
+
+    waiter = {"done": threading.Event()} if request.args.get("wait") == "1" else None
+    try:
+        _ingest_queue.put_nowait((samples, waiter))
+    except queue.Full:
+        return jsonify(error="ingest queue is full"), 503, {"Retry-After": "5"}
+    _start_ingest_drain()
+    if waiter is None:
+        return jsonify(queued=len(samples), errors=errors), 202
+    if not waiter["done"].wait(INGEST_WAIT_S) or waiter["applied"] is None:
+        return jsonify(error="batch not written", queued=len(samples), errors=errors), 503
+    ids = list(dict.fromkeys(s["id"] for s in samples))
+    return jsonify(
+        applied=[i for i in ids if i in waiter["applied"]],
+        duplicate=[i for i in ids if i not in waiter["applied"]],
+        errors=errors,
+    )
 
 
-@app.route("/meals")
+# Meal ideas: (name, calories, protein)
+MEAL_IDEAS = [
+    ("Whey shake + water", 180, 30),
+    ("0% Greek yogurt + berries", 280, 35),
+    ("Cottage cheese bowl", 260, 28),
+    ("Chicken salad (no croutons)", 450, 50),
+    ("Turkey lettuce wrap + side salad", 420, 40),
+    ("Tuna packet + apple", 250, 30),
+    ("Salmon + veggies", 520, 45),
+    ("Egg-white scramble + veggies", 350, 35),
+    ("Lean steak + veggies", 600, 55),
+    ("Protein oatmeal (½ cup oats + whey)", 420, 35),
+]
+# By protein density, then calories
+MEAL_IDEAS_BY_DENSITY = sorted(MEAL_IDEAS, key=lambda x: (-(x[2] / max(x[1], 1)), x[1]))
+
+# "Build a plate" suggestions: (remaining calories at least, suggestions)
+MEAL_PLATES = [
+    (650, [
+        ("Big protein plate", "8–10 oz chicken/salmon/lean beef + 2 cups veggies + ½ cup rice/potato"),
+        ("Restaurant order", "double protein + veggies; sauces on side; skip bread/chips"),
+    ]),
+    (400, [
+        ("Medium plate", "6–8 oz protein + veggies; optional fruit"),
+        ("Snack-proof", "finish with Greek yogurt or shake if protein is short"),
+    ]),
+    (-math.inf, [
+        ("Close-out snack", "shake OR Greek yogurt OR tuna packet"),
+        ("If hungry", "add veggies/salad (very low calorie)"),
+    ]),
+]
+
+MEAL_PLAN_STEP = 10  # DP resolution in calories; costs round up, so plans never go over
+MEAL_PLAN_MAX_CALORIES = 3000
+MEAL_PLAN_MAX_EACH = 2  # default cap on copies of one item
+MEAL_PLAN_MEMO = 256  # solved budgets kept per library version
+
+# Saved meals + MEAL_IDEAS as arrays, rebuilt when the "saved-meals" data
+# version moves; solved plans are memoized on the snapshot.
+_plan_library = {"version": None}
+
+
+def plan_library() -> dict:
+    global _plan_library
+    version = data_versions(["saved-meals"])["saved-meals"][0]
+    if _plan_library["version"] == version:
+        return _plan_library
+
+    items = {meal_key(n): (n, c, p, "idea") for n, c, p in MEAL_IDEAS}
+    rows = db.session.execute(
+        select(SavedMeal.name, SavedMeal.calories, SavedMeal.protein_g)
+        .where(SavedMeal.calories > 0, SavedMeal.protein_g > 0)
+        .order_by(SavedMeal.id)
+    )
+    items.update((meal_key(n), (n, c, p, "saved")) for n, c, p in rows)
+    items = list(items.values())
+    _plan_library = {
+        "version": version,
+        "items": items,
+        "calories": np.array([c for _, c, _, _ in items], dtype=np.int64),
+        "protein": np.array([p for _, _, p, _ in items], dtype=np.int64),
+        "plans": {},
+    }
+    return _plan_library
+
+
+def plan_meals(cal_rem: int, prot_rem: int, max_each: int = MEAL_PLAN_MAX_EACH) -> dict:
+    """Best combination of saved meals and ideas for what's left today.
+
+    Bounded knapsack over calories in MEAL_PLAN_STEP units: a NumPy DP gives
+    the most protein reachable at every budget, then the plan is the
+    cheapest budget that closes the protein gap (or the whole budget when
+    nothing does). Each item is used at most max_each times.
+    """
+    lib = plan_library()
+    cells = min(cal_rem, MEAL_PLAN_MAX_CALORIES) // MEAL_PLAN_STEP
+    memo_key = (cells, prot_rem, max_each)
+    if memo_key in lib["plans"]:
+        return lib["plans"][memo_key]
+
+    plan = {"items": [], "calories": 0, "protein": 0, "closes_gap": prot_rem <= 0}
+    if cells > 0 and prot_rem > 0 and lib["items"]:
+        cost = np.maximum(1, -(-lib["calories"] // MEAL_PLAN_STEP))
+        protein = lib["protein"]
+
+        # At most cells // w units of cost w fit, so per cost only the
+        # best-protein items that could supply them can matter.
+        order = np.lexsort((-protein, cost))
+        sorted_cost = cost[order]
+        group_start = np.searchsorted(sorted_cost, sorted_cost, side="left")
+        rank = np.arange(len(order)) - group_start
+        useful = order[rank * max_each < cells // sorted_cost]
+
+        # Binary-split each item's copies into 0/1 chunks (1, 2, 4, ...)
+        chunks = []
+        for i in useful:
+            left, size = max_each, 1
+            while left > 0:
+                take = min(size, left)
+                chunks.append((int(i), take, int(cost[i]) * take, int(protein[i]) * take))
+                left -= take
+                size *= 2
+
+        best = np.zeros(cells + 1, dtype=np.int64)  # most protein within c cells
+        took = np.zeros((len(chunks), cells + 1), dtype=bool)
+        for j, (_, _, w, p) in enumerate(chunks):
+            if w > cells:
+                continue
+            with_it = best[:-w] + p
+            better = with_it > best[w:]
+            took[j, w:] = better
+            best[w:] = np.where(better, with_it, best[w:])
+
+        reached = np.flatnonzero(best >= prot_rem)
+        c = int(reached[0]) if len(reached) else cells
+        counts = {}
+        for j in range(len(chunks) - 1, -1, -1):
+            if took[j, c]:
+                i, take, w, _ = chunks[j]
+                counts[i] = counts.get(i, 0) + take
+                c -= w
+
+        for i, n in sorted(counts.items(), key=lambda kv: -lib["protein"][kv[0]] * kv[1]):
+            name, calories, prot, source = lib["items"][i]
+            plan["items"].append({"name": name, "calories": calories, "protein_g": prot, "count": n, "source": source})
+            plan["calories"] += calories * n
+            plan["protein"] += prot * n
+        plan["closes_gap"] = plan["protein"] >= prot_rem
+
+    if len(lib["plans"]) >= MEAL_PLAN_MEMO:
+        lib["plans"].clear()
+    lib["plans"][memo_key] = plan
+    return plan
+
+
+@bp.route("/meals")
+@conditional()
 def meal_suggestions():
     today = date.today()
-    log = get_or_create_day(today)
-    recalc_totals(today)
-    log = DayLog.query.filter_by(day=today).first()
+    log = get_day(today)
 
     # Remaining targets (simple)
     cal_rem = (log.cal_target or 0) - (log.calories_total or 0)
     prot_rem = (log.prot_target or 0) - (log.protein_g_total or 0)
 
-    # Meal ideas: (name, calories, protein)
-    ideas = [
-        ("Whey shake + water", 180, 30),
-        ("0% Greek yogurt + berries", 280, 35),
-        ("Cottage cheese bowl", 260, 28),
-        ("Chicken salad (no croutons)", 450, 50),
-        ("Turkey lettuce wrap + side salad", 420, 40),
-        ("Tuna packet + apple", 250, 30),
-        ("Salmon + veggies", 520, 45),
-        ("Egg-white scramble + veggies", 350, 35),
-        ("Lean steak + veggies", 600, 55),
-        ("Protein oatmeal (½ cup oats + whey)", 420, 35),
-    ]
+    try:
+        max_each = min(max(int(request.args.get("max_each", MEAL_PLAN_MAX_EACH)), 1), 5)
+    except ValueError:
+        abort(400)
+    combo = plan_meals(cal_rem, prot_rem, max_each)
 
     # Filter to those that fit remaining calories (allow a little over if very low remaining)
     if cal_rem is None:
-        filtered = ideas
+        filtered = MEAL_IDEAS_BY_DENSITY
     else:
         threshold = max(cal_rem, 250)  # if you're low, still show small options
-        filtered = [i for i in ideas if i[1] <= threshold]
-
-    # Sort by protein density, then calories
-    filtered.sort(key=lambda x: (-(x[2]/max(x[1],1)), x[1]))
+        filtered = [i for i in MEAL_IDEAS_BY_DENSITY if i[1] <= threshold]
 
     # "Build a plate" suggestions by remaining calories
-    plate = []
-    if cal_rem >= 650:
-        plate = [
-            ("Big protein plate", "8–10 oz chicken/salmon/lean beef + 2 cups veggies + ½ cup rice/potato"),
-            ("Restaurant order", "double protein + veggies; sauces on side; skip bread/chips"),
-        ]
-    elif cal_rem >= 400:
-        plate = [
-            ("Medium plate", "6–8 oz protein + veggies; optional fruit"),
-            ("Snack-proof", "finish with Greek yogurt or shake if protein is short"),
-        ]
-    else:
-        plate = [
-            ("Close-out snack", "shake OR Greek yogurt OR tuna packet"),
-            ("If hungry", "add veggies/salad (very low calorie)"),
-        ]
+    plate = next(p for floor, p in MEAL_PLATES if cal_rem >= floor)
 
     # Time window reminder
     window = "11:00 am – 7:00 pm"
@@ -497,96 +2799,768 @@ def meal_suggestions():
         plate=plate,
         window=window,
         today=today,
+        combo=combo,
+        max_each=max_each,
     )
 
 
-@app.route("/guides")
-def guides():
-    restaurant = [
+@bp.route("/meals/search")
+@conditional(lambda **kw: ["meal-names"])
+def meal_search():
+    # Autocomplete over logged and saved meal names
+    try:
+        limit = min(max(int(request.args.get("limit", 8)), 1), 50)
+    except ValueError:
+        abort(400)
+    return jsonify(results=search_meals(request.args.get("q", ""), limit))
+
+
+GUIDES = {
+    "restaurant": [
         ("Steakhouse", "Sirloin, veggies, salad", "Bread, mashed potatoes, dessert"),
         ("Mexican", "Fajita bowl, no tortilla", "Chips, tacos, margaritas"),
         ("Italian", "Grilled chicken, vegetables", "Pasta, bread, creamy sauces"),
         ("Fast Food", "Grilled chicken salad", "Burgers, fries"),
         ("Asian", "Steamed protein + veggies", "Fried rice, noodles, sugary sauces"),
-    ]
-    vacation_rules = [
+    ],
+    "vacation_rules": [
         "Protein at every meal (40g+)",
         "Walk daily (30–60 min)",
         "One indulgence per day max",
         "Zero liquid calories",
         "Resume IF 11am–7pm immediately after trip",
-    ]
-    maintenance = [
+    ],
+    "maintenance": [
         ("Calories", "2300–2400/day"),
         ("Protein", "≥170g/day"),
         ("IF", "Optional, ~5 days/week"),
         ("Lifting", "20 min, 4–5x/week"),
         ("Walking", "Daily"),
         ("Rebound Rule", "If +4 lbs over baseline, tighten 5 days"),
-    ]
-    return render_template("guides.html", restaurant=restaurant, vacation_rules=vacation_rules, maintenance=maintenance)
+    ],
+}
+
+
+# Static pages: no data keys, so the tag only changes on deploy and at midnight
+@bp.route("/guides")
+@conditional(lambda **kw: [])
+def guides():
+    return render_template("guides.html", **GUIDES)
 
 
-@app.route("/reset")
+@bp.route("/reset")
+@conditional(lambda **kw: [])
 def reset_page():
     return render_template("reset.html")
 
 
-@app.route("/reset/activate", methods=["POST"])
+@bp.route("/reset/activate", methods=["POST"])
 def reset_activate():
     today = date.today()
     banner = "EMERGENCY RESET (14 days): 1650 cals / 200g protein / carbs ≤75g / strict IF 11-7 / no alcohol."
-    for i in range(14):
-        d = today + timedelta(days=i)
-        log = get_or_create_day(d)
-        log.cal_target = 1650
-        log.prot_target = 200
-        log.notes = (banner + ("\n\n" + log.notes if log.notes else ""))[:4000]
+    apply_plan(TargetPlan(
+        label=banner,
+        start_day=today,
+        end_day=today + timedelta(days=13),
+        cal_target=1650,
+        prot_target=200,
+    ))
     db.session.commit()
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
+
 
+@bp.route("/plans")
+@conditional()
+def plans():
+    items = TargetPlan.query.order_by(TargetPlan.start_day.desc(), TargetPlan.id.desc()).limit(50).all()
+    return render_template("plans.html", items=items, today=date.today())
 
 
-@app.route("/manifest.json")
+@bp.route("/plans/add", methods=["POST"])
+def plans_add():
+    def to_int(v):
+        v = (v or "").strip()
+        return int(v) if v else None
+
+    start = datetime.strptime(request.form.get("start_day") or date.today().isoformat(), "%Y-%m-%d").date()
+    days = to_int(request.form.get("days")) or 14
+    cal_target = to_int(request.form.get("cal_target"))
+    prot_target = to_int(request.form.get("prot_target"))
+    if not cal_target or not prot_target or days < 1:
+        return redirect(url_for("main.plans"))
+
+    label = (request.form.get("label") or "").strip() or f"{cal_target} cals / {prot_target}g protein"
+    apply_plan(TargetPlan(
+        label=label[:200],
+        start_day=start,
+        end_day=start + timedelta(days=min(days, 366) - 1),
+        cal_target=cal_target,
+        prot_target=prot_target,
+    ))
+    db.session.commit()
+    return redirect(url_for("main.plans"))
+
+
+
+@bp.route("/healthz")
+def healthz():
+    db.session.execute(select(1))
+    return jsonify(status="ok", pid=os.getpid(), preloaded=os.getpid() != _startup_pid, startup=STARTUP, **pool_stats())
+
+
+@bp.route("/metrics")
+def metrics():
+    return current_app.response_class(
+        render_metrics(collect_metrics()),
+        mimetype="text/plain; version=0.0.4",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@bp.route("/manifest.json")
 def manifest():
-    return app.send_static_file("manifest.json")
+    return current_app.send_static_file("manifest.json")
 
-@app.route("/sw.js")
+@bp.route("/sw.js")
 def sw():
-    resp = app.send_static_file("sw.js")
+    # The built copy carries the asset version and precache list
+    if os.path.isfile(os.path.join(DIST_DIR, "sw.js")):
+        resp = send_from_directory(DIST_DIR, "sw.js", max_age=0)
+    else:
+        resp = current_app.send_static_file("sw.js")
     resp.headers["Content-Type"] = "application/javascript"
+    resp.headers["Cache-Control"] = "no-cache"
     return resp
 
 
-@app.route("/export.csv")
-def export_csv():
-    rows = DayLog.query.order_by(DayLog.day.asc()).all()
-    lines = ["date,weight_am,waist_in,calories_total,protein_g_total,cal_target,prot_target,walk_done,lift_done,if_done,notes"]
-    for r in rows:
-        def b(x): return "1" if x else "0"
-        notes = (r.notes or "").replace("\n", "\\n").replace(",", ";")
-        lines.append(
-            f"{r.day.isoformat()},{r.weight_am or ''},{r.waist_in or ''},{r.calories_total or ''},{r.protein_g_total or ''},"
-            f"{r.cal_target or ''},{r.prot_target or ''},{b(r.walk_done)},{b(r.lift_done)},{b(r.if_done)},{notes}"
-        )
-    return app.response_class("\n".join(lines), mimetype="text/csv")
+# kind -> (range column, [(header, column)]); "days" keeps the original
+# export_csv header first so existing spreadsheets still line up.
+EXPORTS = {
+    "days": (DayLog.day, [
+        ("date", DayLog.day),
+        ("weight_am", DayLog.weight_am),
+        ("waist_in", DayLog.waist_in),
+        ("calories_total", DayLog.calories_total),
+        ("protein_g_total", DayLog.protein_g_total),
+        ("cal_target", DayLog.cal_target),
+        ("prot_target", DayLog.prot_target),
+        ("walk_done", DayLog.walk_done),
+        ("lift_done", DayLog.lift_done),
+        ("if_done", DayLog.if_done),
+        ("notes", DayLog.notes),
+        ("walking_miles", DayLog.walking_miles),
+        ("active_calories", DayLog.active_calories),
+        ("rings_closed", DayLog.rings_closed),
+    ]),
+    "meals": (Meal.day, [
+        ("date", Meal.day),
+        ("time", Meal.time),
+        ("name", Meal.name),
+        ("calories", Meal.calories),
+        ("protein_g", Meal.protein_g),
+        ("created_at", Meal.created_at),
+    ]),
+    "workouts": (WorkoutLog.day, [
+        ("date", WorkoutLog.day),
+        ("workout_type", WorkoutLog.workout_type),
+        ("minutes", WorkoutLog.minutes),
+        ("calories", WorkoutLog.calories),
+        ("notes", WorkoutLog.notes),
+        ("created_at", WorkoutLog.created_at),
+    ]),
+    "saved_meals": (SavedMeal.created_at, [
+        ("name", SavedMeal.name),
+        ("calories", SavedMeal.calories),
+        ("protein_g", SavedMeal.protein_g),
+        ("created_at", SavedMeal.created_at),
+    ]),
+}
+EXPORT_BATCH = 500
+
+
+def export_rows(kind: str):
+    """Header plus a streaming row iterator for an export, honouring ?from=/&to=."""
+    if kind not in EXPORTS:
+        abort(404)
+    range_col, columns = EXPORTS[kind]
+
+    def arg_date(name):
+        v = (request.args.get(name) or "").strip()
+        if not v:
+            return None
+        try:
+            return datetime.strptime(v, "%Y-%m-%d").date()
+        except ValueError:
+            abort(400)
+
+    q = select(*[c for _, c in columns])
+    lo, hi = arg_date("from"), arg_date("to")
+    is_datetime = isinstance(range_col.type, db.DateTime)
+    if lo:
+        q = q.where(range_col >= (datetime.combine(lo, dtime.min) if is_datetime else lo))
+    if hi:
+        q = q.where(range_col < (datetime.combine(hi + timedelta(days=1), dtime.min) if is_datetime else hi + timedelta(days=1)))
+    q = q.order_by(range_col.asc()).execution_options(yield_per=EXPORT_BATCH, stream_results=True)
+
+    header = [h for h, _ in columns]
+    rows = db.session.execute(q)
+    if kind == "meals":
+        # Archived meals come back from their segments, merged in day order
+        archived = (tuple(m[c.key] for _, c in columns) for m in iter_archived_meals(db.session, lo, hi))
+        rows = heapq.merge(archived, rows, key=lambda r: r[0])
+    return header, rows
+
+
+def export_response(body, kind: str, ext: str, mimetype: str):
+    resp = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename=fittrack-{kind}.{ext}"
+    return resp
+
 
-@app.route("/workouts", methods=["GET", "POST"])
+@bp.route("/export.csv")
+def export_csv():
+    kind = request.args.get("kind", "days")
+    header, rows = export_rows(kind)
+
+    def cell(v):
+        if v is None:
+            return ""
+        if isinstance(v, bool):
+            return "1" if v else "0"
+        if isinstance(v, (date, datetime)):
+            return v.isoformat()
+        return v
+
+    def generate():
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(header)
+        for i, r in enumerate(rows, 1):
+            w.writerow([cell(v) for v in r])
+            if i % EXPORT_BATCH == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    return export_response(generate(), kind, "csv", "text/csv")
+
+
+@bp.route("/export.jsonl")
+def export_jsonl():
+    kind = request.args.get("kind", "days")
+    header, rows = export_rows(kind)
+
+    def value(v):
+        return v.isoformat() if isinstance(v, (date, datetime)) else v
+
+    def generate():
+        chunk = []
+        for r in rows:
+            chunk.append(json.dumps(dict(zip(header, (value(v) for v in r)))) + "\n")
+            if len(chunk) >= EXPORT_BATCH:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk)
+
+    return export_response(generate(), kind, "jsonl", "application/x-ndjson")
+
+IMPORT_BATCH = 1000
+
+
+def parse_import_value(col, v):
+    # Coerce a CSV string or JSON scalar to the column's Python type.
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return None
+    if isinstance(v, (dict, list)):
+        raise ValueError(f"not a single value: {v!r}")
+    t = col.type
+    if isinstance(t, db.Boolean):
+        if isinstance(v, bool):
+            return v
+        s = str(v).strip().lower()
+        if s in ("1", "true", "on", "yes", "y"):
+            return True
+        if s in ("0", "false", "off", "no", "n"):
+            return False
+        raise ValueError(f"not a boolean: {v!r}")
+    if isinstance(t, db.DateTime):
+        return datetime.fromisoformat(str(v).strip())
+    if isinstance(t, db.Date):
+        return datetime.strptime(str(v).strip()[:10], "%Y-%m-%d").date()
+    if isinstance(t, (db.Integer, db.Float)):
+        n = float(v)
+        if isinstance(v, bool) or not math.isfinite(n):
+            raise ValueError(f"not a number: {v!r}")
+        if isinstance(t, db.Integer):
+            if abs(n) >= 2**31:
+                raise ValueError(f"out of range: {v!r}")
+            return int(n)
+        return n
+    v = str(v)
+    if getattr(t, "length", None):
+        v = v[: t.length]
+    return v
+
+
+def read_import_rows(stream, fmt: str):
+    """Yield (line number, dict) from a CSV or JSONL text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            raise ValueError(f"line {reader.line_num}: {e}") from None
+    elif fmt == "jsonl":
+        for n, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield n, json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"line {n}: {e}") from None
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def import_history(kind: str, rows) -> dict:
+    """Validate and bulk-load export-format rows in one transaction.
+
+    Days are upserted on their unique day (INSERT ... ON CONFLICT (day) DO
+    UPDATE); meals, workouts and saved meals are inserted with executemany,
+    IMPORT_BATCH rows at a time. Meal totals and weekly rollups are rebuilt
+    once per affected day at the end. Raises ValueError (nothing written)
+    on the first invalid row.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f"unknown kind: {kind}")
+    model = EXPORTS[kind][0].class_
+    by_header = {h: c for h, c in EXPORTS[kind][1]}
+    required = [c for c in model.__table__.columns if not c.nullable and c.default is None and not c.primary_key]
+
+    touched = set()
+    meal_logs = []
+    n = 0
+    batch = []
+
+    def flush(batch):
+        if not batch:
+            return
+        keys = set().union(*(r for r, _ in batch))
+        if kind != "days":
+            db.session.execute(insert(model), [{k: r.get(k) for k in keys} for r, _ in batch])
+            return
+        # Blank and missing cells leave an existing day's value as stored
+        # (a plan's targets, an earlier weigh-in); a new day gets the column
+        # default or NULL
+        groups = {}
+        for r, blank in batch:
+            groups.setdefault(blank, []).append({k: r.get(k) for k in keys})
+        for blank, group in groups.items():
+            stmt = dialect_insert(DayLog)
+            set_ = {k: stmt.excluded[k] for k in keys if k != "day" and k not in blank}
+            if set_:
+                stmt = stmt.on_conflict_do_update(index_elements=["day"], set_=set_)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["day"])
+            db.session.execute(stmt, group)
+
+    try:
+        for line, raw in rows:
+            rec, blank = {}, set()
+            try:
+                if not isinstance(raw, dict):
+                    raise ValueError("expected an object")
+                for h, v in raw.items():
+                    col = by_header.get(h)
+                    if col is None:
+                        raise ValueError(f"unknown column {h!r}")
+                    try:
+                        rec[col.key] = parse_import_value(col, v)
+                    except ValueError as e:
+                        raise ValueError(f"{h}: {e}") from None
+                for col in by_header.values():
+                    if rec.get(col.key) is None:
+                        blank.add(col.key)
+                        if col.default is not None:
+                            rec[col.key] = col.default.arg if col.default.is_scalar else col.default.arg(None)
+                        else:
+                            rec[col.key] = None
+                for col in required:
+                    if rec.get(col.key) is None:
+                        raise ValueError(f"{col.key} is required")
+            except ValueError as e:
+                raise ValueError(f"line {line}: {e}") from None
+            if "day" in rec:
+                touched.add(rec["day"])
+            if kind == "meals":
+                meal_logs.append((1, rec["name"], rec["day"], rec.get("calories"), rec.get("protein_g")))
+            batch.append((rec, frozenset(blank)))
+            n += 1
+            if len(batch) >= IMPORT_BATCH:
+                flush(batch)
+                batch = []
+        flush(batch)
+
+        if kind == "meals":
+            rebuild_totals(db.session, touched)
+            apply_meal_logs(db.session, meal_logs)
+            touch_versions(db.session, "meal-names")
+        elif kind == "saved_meals":
+            touch_versions(db.session, "meal-names", "saved-meals")
+        elif kind == "days":
+            refresh_weekly_rollups(db.session, {week_start_of(d) for d in touched})
+            touch_versions(db.session, "weights", "weights-backfill")
+        touch_versions(db.session, "global", *day_keys(touched))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"kind": kind, "rows": n, "days": len(touched)}
+
+
+@bp.cli.command("import-history")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--kind", type=click.Choice(sorted(EXPORTS)), default="days")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Defaults to the file extension.")
+def import_history_command(path, kind, fmt):
+    """Bulk-load a CSV/JSONL export (days, meals, workouts, saved_meals)."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        try:
+            result = import_history(kind, read_import_rows(f, fmt))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    print(f"Imported {result['rows']} {kind} rows across {result['days']} days.")
+
+
+# --- Cold meal archive -------------------------------------------------------
+# `flask archive-meals` moves meals older than MEAL_ARCHIVE_DAYS out of the
+# hot table into an append-only gzip JSONL segment under the ARCHIVE_DIR
+# setting (default instance/archive), keeping
+# per-day totals in meal_archive_days so DayLog totals, rebuilds and exports
+# stay complete. `flask restore-meals` puts a date range back.
+
+MEAL_ARCHIVE_DAYS = env_int("MEAL_ARCHIVE_DAYS", 365)
+MEAL_ARCHIVE_COLUMNS = ["id", "day", "time", "name", "calories", "protein_g", "created_at"]
+
+# segment path -> (size, mtime_ns) when its contents last matched its sha256
+_verified_segments = {}
+
+
+class ArchiveError(Exception):
+    """A segment file is missing, unreadable or doesn't match its digest."""
+
+
+def verify_segment(path: str, sha256: str):
+    """Check a segment's decompressed contents against ArchiveSegment.sha256,
+    once per process while the file is unchanged."""
+    full = os.path.join(current_app.config["ARCHIVE_DIR"], path)
+    try:
+        st = os.stat(full)
+        if _verified_segments.get(path) == (st.st_size, st.st_mtime_ns):
+            return
+        digest = hashlib.sha256()
+        with gzip.open(full, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except (OSError, EOFError, zlib.error) as e:
+        raise ArchiveError(f"archive segment {path} can't be read: {e}") from None
+    if digest.hexdigest() != sha256:
+        raise ArchiveError(f"archive segment {path} doesn't match its sha256 {sha256[:12]}…")
+    _verified_segments[path] = (st.st_size, st.st_mtime_ns)
+
+
+@bp.app_errorhandler(ArchiveError)
+def archive_error(e):
+    return jsonify(error=str(e)), 500
+
+
+def _archive_record(row) -> dict:
+    rec = dict(zip(MEAL_ARCHIVE_COLUMNS, row))
+    rec["day"] = rec["day"].isoformat()
+    rec["created_at"] = rec["created_at"].isoformat() if rec["created_at"] else None
+    return rec
+
+
+def iter_archived_meals(session, start=None, end=None):
+    """Archived meal dicts (Meal column keys) with start <= day <= end, in
+    (day, id) order, read from the segments that still own those days.
+
+    Every segment is verified before this returns, so a missing or corrupt
+    file raises ArchiveError up front rather than partway through an export.
+    """
+    q = select(MealArchiveDay.segment_id, MealArchiveDay.day)
+    if start is not None:
+        q = q.where(MealArchiveDay.day >= start)
+    if end is not None:
+        q = q.where(MealArchiveDay.day <= end)
+    owned = {}
+    for segment_id, d in session.execute(q):
+        owned.setdefault(segment_id, set()).add(d.isoformat())
+    if not owned:
+        return iter(())
+    paths = {}
+    for segment_id, path, sha256 in session.execute(
+        select(ArchiveSegment.id, ArchiveSegment.path, ArchiveSegment.sha256).where(ArchiveSegment.id.in_(owned))
+    ):
+        verify_segment(path, sha256)
+        paths[segment_id] = path
+
+    def read(segment_id):
+        with gzip.open(os.path.join(current_app.config["ARCHIVE_DIR"], paths[segment_id]), "rt", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec["day"] in owned[segment_id]:
+                    rec["day"] = date.fromisoformat(rec["day"])
+                    rec["created_at"] = datetime.fromisoformat(rec["created_at"]) if rec["created_at"] else None
+                    yield rec
+
+    return heapq.merge(*(read(sid) for sid in sorted(owned)), key=lambda m: (m["day"], m["id"]))
+
+
+def archive_meals(session, before: date) -> dict:
+    """Move every meal with day < before into a new segment; the caller commits.
+
+    The segment is written and fsynced under a temporary name and renamed
+    into place before any row is deleted, so a failure leaves the database
+    untouched (at worst an unreferenced file).
+    """
+    cols = [getattr(Meal, c) for c in MEAL_ARCHIVE_COLUMNS]
+    max_id = session.execute(select(func.max(Meal.id)).where(Meal.day < before)).scalar()
+    if max_id is None:
+        return {"rows": 0, "days": 0, "segment": None}
+
+    archive_dir = current_app.config["ARCHIVE_DIR"]
+    os.makedirs(os.path.join(archive_dir, "meals"), exist_ok=True)
+    tmp = os.path.join(archive_dir, "meals", f".segment-{os.getpid()}.tmp")
+    per_day, n, digest = {}, 0, hashlib.sha256()
+    result = session.execute(
+        select(*cols).where(Meal.day < before, Meal.id <= max_id)
+        .order_by(Meal.day, Meal.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            for row in result:
+                line = (json.dumps(_archive_record(row), separators=(",", ":")) + "\n").encode()
+                digest.update(line)
+                f.write(line)
+                totals = per_day.setdefault(row.day, [0, 0, 0])
+                totals[0] += 1
+                totals[1] += row.calories or 0
+                totals[2] += row.protein_g or 0
+                n += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    start, end = min(per_day), max(per_day)
+    rel = os.path.join("meals", f"meals-{start.isoformat()}_{end.isoformat()}-{digest.hexdigest()[:12]}.jsonl.gz")
+    os.replace(tmp, os.path.join(archive_dir, rel))
+
+    segment = ArchiveSegment(kind="meals", start_day=start, end_day=end, path=rel, rows=n, sha256=digest.hexdigest())
+    session.add(segment)
+    session.flush()
+    session.execute(insert(MealArchiveDay), [
+        {"day": d, "segment_id": segment.id, "meals": m, "calories": c, "protein_g": p}
+        for d, (m, c, p) in sorted(per_day.items())
+    ])
+    session.execute(delete(Meal).where(Meal.day < before, Meal.id <= max_id))
+    rebuild_totals(session, per_day)
+    return {"rows": n, "days": len(per_day), "segment": rel}
+
+
+def restore_meals(session, start: date, end: date) -> int:
+    """Copy archived meals for [start, end] back into meals (new ids) and
+    release those days from their segments; the caller commits."""
+    rows = [
+        {k: m[k] for k in MEAL_ARCHIVE_COLUMNS if k != "id"}
+        for m in iter_archived_meals(session, start, end)
+    ]
+    for i in range(0, len(rows), IMPORT_BATCH):
+        session.execute(insert(Meal), rows[i:i + IMPORT_BATCH])
+    session.execute(delete(MealArchiveDay).where(MealArchiveDay.day.between(start, end)))
+    touch_versions(session, "global", *day_keys({r["day"] for r in rows}))
+    return len(rows)
+
+
+def vacuum_meals():
+    # Give the freed pages back so the meals indexes stay small and cached
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if db.engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("VACUUM (ANALYZE) meals")
+        else:
+            conn.exec_driver_sql("VACUUM")
+
+
+@bp.cli.command("archive-meals")
+@click.option("--older-than", "days", type=int, default=MEAL_ARCHIVE_DAYS, show_default=True,
+              help="Archive meals from days before today minus this many days.")
+@click.option("--vacuum/--no-vacuum", default=False, help="VACUUM afterwards.")
+def archive_meals_command(days, vacuum):
+    """Move old meals into a compressed archive segment."""
+    result = archive_meals(db.session, date.today() - timedelta(days=days))
+    db.session.commit()
+    if not result["rows"]:
+        print("Nothing to archive.")
+        return
+    print(f"Archived {result['rows']} meals from {result['days']} days into {result['segment']}.")
+    if vacuum:
+        vacuum_meals()
+
+
+@bp.cli.command("restore-meals")
+@click.option("--from", "start", type=click.DateTime(["%Y-%m-%d"]), required=True)
+@click.option("--to", "end", type=click.DateTime(["%Y-%m-%d"]), required=True)
+def restore_meals_command(start, end):
+    """Move archived meals for a date range back into the meals table."""
+    try:
+        n = restore_meals(db.session, start.date(), end.date())
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    print(f"Restored {n} meals.")
+
+
+@bp.route("/import", methods=["POST"])
+def import_upload():
+    kind = request.form.get("kind", "days")
+    f = request.files.get("file")
+    if not f or not f.filename:
+        return jsonify(error="no file uploaded"), 400
+    fmt = request.form.get("format") or ("jsonl" if f.filename.endswith((".jsonl", ".ndjson")) else "csv")
+    stream = io.TextIOWrapper(f.stream, encoding="utf-8", newline="")
+    try:
+        result = import_history(kind, read_import_rows(stream, fmt))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify(error=str(e)), 400
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html":
+        return redirect(url_for("main.settings", imported=result["rows"], kind=kind))
+    return jsonify(result)
+
+
+# kind -> keyset columns (newest first), page columns, per-page aggregates.
+# Meals and workouts seek on (day, id): the day index carries the rowid on
+# SQLite, so every page is an index range scan however deep it is.
+HISTORY = {
+    "days": {
+        "keys": (DayLog.day,),
+        "columns": [
+            DayLog.day, DayLog.weight_am, DayLog.waist_in, DayLog.calories_total, DayLog.cal_target,
+            DayLog.protein_g_total, DayLog.prot_target, DayLog.walking_miles, DayLog.rings_closed,
+            DayLog.compliance.label("score"),
+        ],
+        "aggregates": lambda c: [
+            func.avg(c.weight_am).label("avg_weight"),
+            func.avg(c.calories_total).label("avg_calories"),
+            func.avg(c.protein_g_total).label("avg_protein"),
+            func.sum(c.walking_miles).label("miles"),
+            func.avg(c.score).label("avg_score"),
+        ],
+    },
+    "meals": {
+        "keys": (Meal.day, Meal.id),
+        "columns": [Meal.id, Meal.day, Meal.time, Meal.name, Meal.calories, Meal.protein_g],
+        "aggregates": lambda c: [
+            func.count(func.distinct(c.day)).label("days"),
+            func.sum(c.calories).label("calories"),
+            func.sum(c.protein_g).label("protein"),
+            func.avg(c.calories).label("avg_calories"),
+        ],
+    },
+    "workouts": {
+        "keys": (WorkoutLog.day, WorkoutLog.id),
+        "columns": [
+            WorkoutLog.id, WorkoutLog.day, WorkoutLog.workout_type, WorkoutLog.minutes,
+            WorkoutLog.calories, WorkoutLog.notes,
+        ],
+        "aggregates": lambda c: [
+            func.count(func.distinct(c.day)).label("days"),
+            func.sum(c.minutes).label("minutes"),
+            func.sum(c.calories).label("calories"),
+        ],
+    },
+}
+HISTORY_PAGE = 30
+
+
+def parse_cursor(kind: str, value: str) -> tuple:
+    # "2026-03-01" for days, "2026-03-01.42" (day.id) for meals/workouts
+    parts = value.split(".")
+    if len(parts) != len(HISTORY[kind]["keys"]):
+        raise ValueError(f"bad cursor: {value!r}")
+    return (date.fromisoformat(parts[0]), *(int(p) for p in parts[1:]))
+
+
+def history_page(kind: str, before=None, after=None, size: int = HISTORY_PAGE) -> dict:
+    """One keyset page of history, newest first, plus SQL aggregates over it.
+
+    before/after are cursor tuples from parse_cursor(); without either the
+    page starts at the newest row. Read-only: column reads, no ORM objects.
+    """
+    cfg = HISTORY[kind]
+    keys = cfg["keys"]
+    seek = tuple_(*keys) if len(keys) > 1 else keys[0]
+    q = select(*cfg["columns"])
+    if after is not None:
+        value = tuple_(*after) if len(keys) > 1 else after[0]
+        q = q.where(seek > value).order_by(*(k.asc() for k in keys))
+    else:
+        if before is not None:
+            value = tuple_(*before) if len(keys) > 1 else before[0]
+            q = q.where(seek < value)
+        q = q.order_by(*(k.desc() for k in keys))
+
+    rows = db.session.execute(q.limit(size + 1)).all()
+    more = len(rows) > size
+    rows = rows[:size]
+    page = q.limit(size).subquery()
+    totals = db.session.execute(
+        select(func.count().label("rows"), *cfg["aggregates"](page.c))
+    ).one()._asdict()
+    if after is not None:
+        rows.reverse()
+
+    def cursor(row):
+        return ".".join(str(getattr(row, k.key)) for k in keys)
+
+    return {
+        "rows": rows,
+        "totals": totals,
+        "newer": cursor(rows[0]) if rows and (before is not None or (after is not None and more)) else None,
+        "older": cursor(rows[-1]) if rows and (more if after is None else True) else None,
+    }
+
+
+@bp.route("/history")
+@bp.route("/history/<kind>")
+@conditional(lambda kind="days": ["global"])
+def history(kind="days"):
+    if kind not in HISTORY:
+        abort(404)
+    try:
+        before = parse_cursor(kind, request.args["before"]) if request.args.get("before") else None
+        after = parse_cursor(kind, request.args["after"]) if request.args.get("after") else None
+        size = min(max(int(request.args.get("size", HISTORY_PAGE)), 5), 200)
+    except ValueError:
+        abort(400)
+    page = history_page(kind, before, after, size)
+    return render_template("history.html", kind=kind, size=size, **page)
+
+
+@bp.route("/workouts", methods=["GET", "POST"])
+@conditional()
 def workouts():
     today = date.today()
 
     if request.method == "POST":
-        wtype = (request.form.get("workout_type") or "").strip()
-        minutes = int(request.form.get("minutes") or 0)
-        calories = int(request.form.get("calories") or 0)
-        notes = (request.form.get("notes") or "").strip()[:250]
-
-        if wtype:
-            w = WorkoutLog(day=today, workout_type=wtype, minutes=minutes, calories=calories, notes=notes)
+        w = workout_from_form(today, request.form)
+        if w:
             db.session.add(w)
             db.session.commit()
 
-        return redirect(url_for("workouts"))
+        return redirect(url_for("main.workouts"))
 
     items = WorkoutLog.query.filter_by(day=today).order_by(WorkoutLog.created_at.desc()).all()
     total_minutes = sum(x.minutes for x in items)
@@ -602,5 +3576,45 @@ def workouts():
 
 
 
+def create_app(config: dict = None) -> Flask:
+    """Build the app: config from the environment (overridden by `config`),
+    the database and the main blueprint.
+
+    The engine does not connect until first used; the schema is left to
+    migrate()/ensure_schema(), which the first app context runs.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url(os.getenv("DATABASE_URL")),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        ARCHIVE_DIR=os.getenv("ARCHIVE_DIR") or os.path.join(app.instance_path, "archive"),
+    )
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+    db.init_app(app)
+    app.register_blueprint(bp)
+    before_render_template.connect(_render_start, app)
+    template_rendered.connect(_render_end, app)
+    appcontext_pushed.connect(_schema_on_first_context, app)
+    startup_phase("create_app", started)
+    return app
+
+
+def warm():
+    """Compile every template up front. Run in the gunicorn master so forked
+    workers share the compiled code instead of each building it on its first
+    requests."""
+    started = time.perf_counter()
+    for name in current_app.jinja_env.list_templates():
+        current_app.jinja_env.get_template(name)
+    startup_phase("warm", started)
+
+
+# gunicorn's entry point (app:app)
+app = create_app()
+startup_phase("import", _import_started)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,531 @@
+"""Latency/load benchmarks over a synthetic multi-year dataset.
+
+    python bench.py seed --db sqlite:////tmp/bench.db --years 5 --meals-per-day 6
+    python bench.py run  --db sqlite:////tmp/bench.db --out bench.json [--baseline bench_baseline.json] [--cached]
+    python bench.py load --db sqlite:////tmp/bench.db --workers 4 --concurrency 8 --duration 20 [--read-cache /tmp/bench.cache]
+    python bench.py startup --db sqlite:////tmp/bench.db --workers 4
+
+`run` drives every page through the Flask test client and records p50/p95
+latency, SQL statements and peak Python memory per route. The read cache is
+off so every request runs its view; --cached measures repeat reads with it on. `load` starts
+gunicorn on the same database and hammers it with a threaded HTTP client;
+the read cache is off unless --read-cache gives its workers a shared file.
+`startup` times a bare `import app` and gunicorn boots with and without
+--preload: time until the first and the last worker is up, per-worker boot
+time and the latency of each worker's first request.
+All write JSON; with --baseline, `run` exits 1 when a route regresses past
+the thresholds. Pass a postgresql:// URL to --db to benchmark Postgres.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(db_url: str, cached: bool = False):
+    # app.py reads DATABASE_URL and the read cache settings at import time
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("REQUEST_LOG", "0")
+    if not cached:
+        os.environ["READ_CACHE_SIZE"] = "0"
+        os.environ.pop("READ_CACHE_PATH", None)
+    sys.path.insert(0, ROOT)
+    import app
+    return app
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+# --- seed -------------------------------------------------------------------
+
+MEAL_NAMES = [
+    "Protein shake", "Greek yogurt + berries", "Chicken bowl", "Tuna pack + apple",
+    "Salmon + veggies", "Egg-white scramble", "Lean steak + veggies", "Cottage cheese bowl",
+]
+WORKOUT_TYPES = ["Upper DB", "Lower DB", "Mirror Strength", "Mobility", "Core", "Walk"]
+
+
+def seed(args):
+    A = load_app(args.db)
+    rnd = random.Random(args.seed)
+    today = date.today()
+    start = today - timedelta(days=int(args.years * 365))
+    n_days = (today - start).days + 1
+
+    with A.app.app_context():
+        A.db.drop_all()
+        A.migrate()
+        t0 = time.perf_counter()
+
+        def bulk(model, rows):
+            for i in range(0, len(rows), 5000):
+                A.db.session.execute(A.insert(model), rows[i:i + 5000])
+
+        days, meals, workouts = [], [], []
+        weight = 235.0
+        for i in range(n_days):
+            d = start + timedelta(days=i)
+            weight += rnd.gauss(-0.03, 0.5)
+            days.append({
+                "day": d,
+                "weight_am": round(weight, 1) if rnd.random() < 0.85 else None,
+                "waist_in": round(40 - i * 0.002 + rnd.gauss(0, 0.2), 1) if rnd.random() < 0.3 else None,
+                "walk_done": rnd.random() < 0.7,
+                "lift_done": rnd.random() < 0.5,
+                "if_done": rnd.random() < 0.6,
+                "rings_closed": rnd.random() < 0.4,
+                "walking_miles": round(rnd.uniform(0, 6), 2),
+                "active_calories": rnd.randint(150, 900),
+                "cal_target": 2000,
+                "prot_target": 190,
+                "notes": "synthetic" if rnd.random() < 0.1 else None,
+            })
+            for j in range(args.meals_per_day):
+                meals.append({
+                    "day": d,
+                    "time": f"{11 + j % 8}:{rnd.choice(['00', '15', '30', '45'])}",
+                    "name": rnd.choice(MEAL_NAMES),
+                    "calories": rnd.randint(150, 700),
+                    "protein_g": rnd.randint(10, 60),
+                    "created_at": datetime.combine(d, datetime.min.time()) + timedelta(hours=11 + j),
+                })
+            for j in range(args.workouts_per_day):
+                workouts.append({
+                    "day": d,
+                    "workout_type": rnd.choice(WORKOUT_TYPES),
+                    "minutes": rnd.randint(10, 60),
+                    "calories": rnd.randint(50, 400),
+                    "notes": None,
+                    "created_at": datetime.combine(d, datetime.min.time()) + timedelta(hours=7),
+                })
+        saved = [
+            {"name": f"{rnd.choice(MEAL_NAMES)} #{i}", "calories": rnd.randint(150, 800), "protein_g": rnd.randint(10, 70)}
+            for i in range(args.saved_meals)
+        ]
+
+        bulk(A.DayLog, days)
+        bulk(A.Meal, meals)
+        bulk(A.WorkoutLog, workouts)
+        bulk(A.SavedMeal, saved)
+        A.rebuild_totals(A.db.session)
+        A.rebuild_meal_frequency(A.db.session)
+        A.db.session.commit()
+        print(f"Seeded {n_days} days, {len(meals)} meals, {len(workouts)} workouts, "
+              f"{len(saved)} saved meals in {time.perf_counter() - t0:.1f}s")
+
+
+# --- run --------------------------------------------------------------------
+
+BENCH_MEAL = "Bench shake"  # what the write cases log; removed again by undo_writes()
+
+
+def undo_writes(A):
+    """Delete the meals the POST cases added and rebuild what they changed
+    (totals, rollups, meal ranking), so every run measures the seeded data."""
+    with A.app.app_context():
+        days = set(A.db.session.scalars(A.select(A.Meal.day).where(A.Meal.name == BENCH_MEAL).distinct()))
+        if days:
+            A.db.session.execute(A.delete(A.Meal).where(A.Meal.name == BENCH_MEAL))
+            A.rebuild_totals(A.db.session, days)
+            A.rebuild_meal_frequency(A.db.session)
+            A.db.session.commit()
+        A.db.session.remove()
+
+
+def routes():
+    today = date.today()
+    past = today - timedelta(days=400)
+    return [
+        ("GET /", "GET", "/", None),
+        ("GET / (304)", "GET", "/", "etag"),
+        ("GET /day today", "GET", f"/day/{today.isoformat()}", None),
+        ("GET /day past", "GET", f"/day/{past.isoformat()}", None),
+        ("GET /weekly", "GET", "/weekly", None),
+        ("GET /weekly 5y", "GET", "/weekly?weeks=260", None),
+        ("GET /meals", "GET", "/meals", None),
+        ("GET /saved", "GET", "/saved", None),
+        ("GET /meals/search", "GET", "/meals/search?q=pro", None),
+        ("GET /series 30d", "GET", "/series.json?metrics=weight,weight_trend,goal,compliance&range=30d", None),
+        ("GET /series all", "GET", "/series.json?metrics=weight,weight_trend,goal,compliance&range=all", None),
+        ("GET /streaks", "GET", "/streaks.json", None),
+        ("GET /workouts", "GET", "/workouts", None),
+        ("GET /plans", "GET", "/plans", None),
+        ("GET /settings", "GET", "/settings", None),
+        ("GET /guides", "GET", "/guides", None),
+        ("GET /export.csv days", "GET", "/export.csv?kind=days", None),
+        ("GET /export.csv meals", "GET", "/export.csv?kind=meals", None),
+        ("GET /export.jsonl meals", "GET", "/export.jsonl?kind=meals", None),
+        ("POST /meal/quick_add", "POST", "/meal/quick_add",
+         {"day": today.isoformat(), "name": BENCH_MEAL, "calories": "200", "protein_g": "30"}),
+    ]
+
+
+def run_routes(A, args, client, counter) -> dict:
+    results = {}
+    for name, method, path, extra in routes():
+        headers = {}
+        if extra == "etag":
+            headers["If-None-Match"] = client.get(path).headers.get("ETag", "")
+        data = extra if isinstance(extra, dict) else None
+
+        for _ in range(args.warmup):
+            client.open(path, method=method, data=data, headers=headers).close()
+
+        times, statements = [], []
+        for _ in range(args.requests):
+            counter["n"] = 0
+            t0 = time.perf_counter()
+            resp = client.open(path, method=method, data=data, headers=headers)
+            body = resp.get_data()  # drains streamed responses
+            times.append((time.perf_counter() - t0) * 1000)
+            statements.append(counter["n"])
+            resp.close()
+
+        # One traced request: tracemalloc slows everything down, so keep it
+        # out of the timed loop.
+        tracemalloc.start()
+        resp = client.open(path, method=method, data=data, headers=headers)
+        body = resp.get_data()
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        size, status = len(body), resp.status_code
+        resp.close()
+
+        results[name] = {
+            "status": status,
+            "p50_ms": round(percentile(times, 50), 2),
+            "p95_ms": round(percentile(times, 95), 2),
+            "statements": max(statements),
+            "peak_kb": round(peak_kb, 1),
+            "bytes": size,
+        }
+        r = results[name]
+        print(f"{name:28} {status:>3} p50 {r['p50_ms']:8.2f}ms  p95 {r['p95_ms']:8.2f}ms  "
+              f"sql {r['statements']:3}  peak {r['peak_kb']:9.1f}KB  {size:>9}B")
+
+    return results
+
+
+def run(args):
+    A = load_app(args.db, cached=args.cached)
+    counter = {"n": 0}
+    with A.app.app_context():
+        A.event.listen(A.db.engine, "before_cursor_execute", lambda *a: counter.__setitem__("n", counter["n"] + 1))
+        dialect = A.db.engine.dialect.name
+    # Leftovers from an interrupted run would skew the counts and the pages
+    undo_writes(A)
+    with A.app.app_context():
+        counts = {m.__tablename__: A.db.session.query(m).count() for m in (A.DayLog, A.Meal, A.WorkoutLog, A.SavedMeal)}
+        A.db.session.remove()
+
+    try:
+        results = run_routes(A, args, A.app.test_client(), counter)
+    finally:
+        undo_writes(A)
+
+    report = {
+        "meta": {
+            "dialect": dialect,
+            "rows": counts,
+            "requests": args.requests,
+            "cached": args.cached,
+            "python": platform.python_version(),
+            "at": datetime.utcnow().isoformat(timespec="seconds"),
+        },
+        "routes": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        failures = compare(report, args.baseline, args.tolerance, args.min_ms)
+        for line in failures:
+            print("REGRESSION", line)
+        if failures:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+def compare(report, baseline_path, tolerance, min_ms):
+    """Lines describing routes that got slower, chattier or hungrier."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base = baseline["routes"]
+    failures = []
+    if baseline["meta"].get("cached", False) != report["meta"]["cached"]:
+        return [f"baseline was recorded with cached={baseline['meta'].get('cached', False)}; match --cached"]
+    for name, cur in report["routes"].items():
+        old = base.get(name)
+        if not old:
+            continue
+        if cur["p95_ms"] > old["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - old["p95_ms"] > min_ms:
+            failures.append(f"{name}: p95 {old['p95_ms']} -> {cur['p95_ms']} ms")
+        if cur["statements"] > old["statements"]:
+            failures.append(f"{name}: statements {old['statements']} -> {cur['statements']}")
+        if cur["peak_kb"] > old["peak_kb"] * (1 + tolerance) and cur["peak_kb"] - old["peak_kb"] > 256:
+            failures.append(f"{name}: peak memory {old['peak_kb']} -> {cur['peak_kb']} KB")
+    return failures
+
+
+# --- load -------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load(args):
+    base_url = args.url
+    proc = None
+    if not base_url:
+        undo_writes(load_app(args.db))
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, DATABASE_URL=args.db)
+        env.setdefault("REQUEST_LOG", "0")
+        if args.read_cache:
+            env.pop("READ_CACHE_SIZE", None)
+            env["READ_CACHE_PATH"] = args.read_cache
+        else:
+            env["READ_CACHE_SIZE"] = "0"
+        proc = subprocess.Popen(
+            ["gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{port}", "app:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + "/healthz", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            proc.kill()
+            sys.exit("gunicorn did not come up")
+
+    paths = [(name, method, path, extra) for name, method, path, extra in routes()
+             if extra != "etag" and "export" not in path]
+    samples = {name: [] for name, *_ in paths}
+    errors = {name: 0 for name, *_ in paths}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < stop_at:
+            name, method, path, extra = paths[i % len(paths)]
+            i += 1
+            body = urllib.parse.urlencode(extra).encode() if isinstance(extra, dict) else None
+            t0 = time.perf_counter()
+            try:
+                # 3xx after POST is success; don't follow it
+                req = urllib.request.Request(base_url + path, data=body, method=method)
+                with urllib.request.build_opener(NoRedirect).open(req, timeout=30) as resp:
+                    resp.read()
+                ok = True
+            except urllib.error.HTTPError as e:
+                ok = 300 <= e.code < 400
+            except OSError:
+                ok = False
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                if ok:
+                    samples[name].append(ms)
+                else:
+                    errors[name] += 1
+
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+            undo_writes(load_app(args.db))
+
+    report = {"meta": {"url": base_url, "workers": args.workers, "concurrency": args.concurrency,
+                       "duration_s": args.duration, "read_cache": args.read_cache}, "routes": {}}
+    for name, *_ in paths:
+        s = samples[name]
+        report["routes"][name] = {
+            "requests": len(s),
+            "errors": errors[name],
+            "rps": round(len(s) / args.duration, 1),
+            "p50_ms": round(percentile(s, 50), 2) if s else None,
+            "p95_ms": round(percentile(s, 95), 2) if s else None,
+        }
+        r = report["routes"][name]
+        print(f"{name:28} {r['requests']:6} req  {r['errors']:4} err  p50 {r['p50_ms']}ms  p95 {r['p95_ms']}ms")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+# --- startup ----------------------------------------------------------------
+
+def boot_gunicorn(db_url, workers, preload):
+    """Start gunicorn and time it from the workers' own startup log lines."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=db_url, GUNICORN_PRELOAD=str(int(preload)))
+    env.setdefault("REQUEST_LOG", "0")
+    started = time.time()
+    proc = subprocess.Popen(
+        ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    ready, first_requests = [], {}
+
+    def read_log():
+        for line in proc.stderr:
+            if "{" not in line:
+                continue
+            try:
+                entry = json.loads(line[line.index("{"):])
+            except ValueError:
+                continue
+            if entry.get("event") == "worker_ready":
+                ready.append(entry)
+            elif entry.get("phase") == "first_request":
+                first_requests[entry["pid"]] = entry["ms"]
+
+    def get(path):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=30).read()
+        except OSError:
+            pass
+
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        deadline = time.perf_counter() + 60
+        while len(ready) < workers and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        if len(ready) < workers:
+            sys.exit("gunicorn did not come up")
+        # Cold latency: the first request each worker serves. Concurrent
+        # rounds spread the requests over the (sync) workers.
+        for _ in range(20):
+            if len(first_requests) >= workers:
+                break
+            threads = [threading.Thread(target=get, args=("/",)) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait()
+    boots = [r["boot_ms"] for r in ready]
+    return {
+        "first_worker_ms": round((min(r["at"] for r in ready) - started) * 1000, 1),
+        "all_workers_ms": round((max(r["at"] for r in ready) - started) * 1000, 1),
+        "worker_boot_ms_p50": round(percentile(boots, 50), 1),
+        "worker_boot_ms_max": round(max(boots), 1),
+        "first_request_ms_p50": round(percentile(list(first_requests.values()), 50), 1),
+    }
+
+
+def startup(args):
+    # Make sure the schema exists, so neither mode pays for creating it
+    A = load_app(args.db)
+    with A.app.app_context():
+        A.ensure_schema()
+
+    env = dict(os.environ, DATABASE_URL=args.db, REQUEST_LOG="0")
+    imports = []
+    for _ in range(args.repeat):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, check=True,
+                       stderr=subprocess.DEVNULL)
+        imports.append((time.perf_counter() - t) * 1000)
+    report = {"meta": {"db": args.db, "workers": args.workers, "repeat": args.repeat},
+              "import_ms_p50": round(percentile(imports, 50), 1), "gunicorn": {}}
+    print(f"python -c 'import app'  p50 {report['import_ms_p50']}ms")
+
+    for preload in (False, True):
+        runs = [boot_gunicorn(args.db, args.workers, preload) for _ in range(args.repeat)]
+        summary = {k: round(percentile([r[k] for r in runs], 50), 1) for k in runs[0]}
+        name = "preload" if preload else "no_preload"
+        report["gunicorn"][name] = summary
+        print(f"{name:11} " + "  ".join(f"{k} {v}" for k, v in summary.items()))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("seed", help="replace the database contents with synthetic history")
+    s.add_argument("--db", required=True)
+    s.add_argument("--years", type=float, default=5)
+    s.add_argument("--meals-per-day", type=int, default=6)
+    s.add_argument("--workouts-per-day", type=int, default=1)
+    s.add_argument("--saved-meals", type=int, default=50)
+    s.add_argument("--seed", type=int, default=1)
+    s.set_defaults(func=seed)
+
+    r = sub.add_parser("run", help="per-route latency, SQL count and memory via the test client")
+    r.add_argument("--db", required=True)
+    r.add_argument("--requests", type=int, default=30)
+    r.add_argument("--warmup", type=int, default=3)
+    r.add_argument("--out")
+    r.add_argument("--baseline")
+    r.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95/memory growth")
+    r.add_argument("--min-ms", type=float, default=2.0, help="ignore p95 growth smaller than this")
+    r.add_argument("--cached", action="store_true", help="leave the read cache on (repeat GETs are hits)")
+    r.set_defaults(func=run)
+
+    l = sub.add_parser("load", help="concurrent HTTP load against gunicorn")
+    l.add_argument("--db", required=True)
+    l.add_argument("--url", help="benchmark a running server instead of starting gunicorn")
+    l.add_argument("--workers", type=int, default=2)
+    l.add_argument("--concurrency", type=int, default=8)
+    l.add_argument("--duration", type=float, default=15)
+    l.add_argument("--read-cache", help="READ_CACHE_PATH for the workers")
+    l.add_argument("--out")
+    l.set_defaults(func=load)
+
+    st = sub.add_parser("startup", help="import and gunicorn boot times, with and without --preload")
+    st.add_argument("--db", required=True)
+    st.add_argument("--workers", type=int, default=4)
+    st.add_argument("--repeat", type=int, default=3)
+    st.add_argument("--out")
+    st.set_defaults(func=startup)
+
+    args = p.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
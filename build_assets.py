@@ -0,0 +1,245 @@
+"""Build fingerprinted static assets into static/dist.
+
+    python build_assets.py
+
+1. Compiles a purged, minified Tailwind stylesheet from templates/ with the
+   standalone Tailwind CLI (TAILWIND_BIN, `tailwindcss` on PATH, or a pinned
+   release downloaded to .cache/).
+2. Vendors a pinned Chart.js build (CHARTJS_SRC may point at a local copy).
+   Downloads must match the SHA-256 recorded below or the build stops; with
+   no local copy and no pin the step is skipped and the page keeps loading
+   that library from the CDN.
+3. Copies every asset to a content-hashed name with .gz/.br siblings
+   (brotli only if the Brotli package is installed).
+4. Resizes the images to AVIF/WebP variants at several widths (needs
+   Pillow; encodes are cached in .cache/images/ by source hash).
+5. Writes static/dist/assets.json (logical name -> hashed name, plus image
+   sizes and variants) and renders static/dist/sw.js with a versioned
+   cache name and precache list.
+
+app.py serves the results from /assets/ with immutable cache headers and
+falls back to the CDN scripts for whichever library static/dist does not have.
+"""
+import gzip
+import hashlib
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only without it
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional: no responsive variants without it
+    Image = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, "static")
+DIST = os.path.join(STATIC, "dist")
+CACHE = os.path.join(ROOT, ".cache")
+
+TAILWIND_VERSION = "3.4.17"
+CHARTJS_VERSION = "4.4.1"
+CHARTJS_URL = f"https://cdn.jsdelivr.net/npm/chart.js@{CHARTJS_VERSION}/dist/chart.umd.min.js"
+# SHA-256 of each download, checked before it is used (the cached copy too).
+# Take values from the release's sha256sums.txt / the npm tarball, never
+# from the file just fetched. Nothing is downloaded without an entry: set
+# TAILWIND_BIN (or CHARTJS_SRC) or the page uses the CDN build instead.
+TAILWIND_SHA256 = {}  # release asset name -> digest from v3.4.17 sha256sums.txt
+CHARTJS_SHA256 = None  # of chart.umd.min.js in chart.js@4.4.1
+
+# Files under static/ that get fingerprinted alongside the built ones.
+STATIC_ASSETS = ["images/hero.jpg", "images/card1.jpg", "images/card2.jpg", "icon-192.png", "icon-512.png"]
+COMPRESSIBLE = (".css", ".js", ".json", ".svg")
+# Precached by the service worker (images are fetched on demand).
+PRECACHE = ["app.css", "vendor/chart.umd.min.js"]
+
+IMAGES = ["images/hero.jpg", "images/card1.jpg", "images/card2.jpg"]
+IMAGE_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+# format -> Pillow save options, best first
+IMAGE_FORMATS = {
+    "avif": {"quality": 50},
+    "webp": {"quality": 75, "method": 6},
+}
+
+TAILWIND_INPUT = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+
+
+def sha256_of(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_pinned(url: str, dest: str, sha256: str):
+    """Download url to dest unless cached, then check it against sha256;
+    exits (removing the file) on a mismatch."""
+    if not os.path.exists(dest):
+        print(f"  fetching {url}")
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=60) as r, open(dest + ".part", "wb") as f:
+            shutil.copyfileobj(r, f)
+        os.replace(dest + ".part", dest)
+    actual = sha256_of(dest)
+    if actual != sha256:
+        os.unlink(dest)
+        sys.exit(f"SHA-256 mismatch for {url}: expected {sha256}, got {actual}")
+
+
+def tailwind_bin():
+    """The Tailwind CLI to run, or None when none is installed and no
+    release is pinned for this platform."""
+    explicit = os.getenv("TAILWIND_BIN") or shutil.which("tailwindcss")
+    if explicit:
+        return explicit
+    system = {"Linux": "linux", "Darwin": "macos", "Windows": "windows"}[platform.system()]
+    arch = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "x64"
+    name = f"tailwindcss-{system}-{arch}" + (".exe" if system == "windows" else "")
+    path = os.path.join(CACHE, f"tailwindcss-{TAILWIND_VERSION}", name)
+    if name not in TAILWIND_SHA256:
+        return None
+    url = f"https://github.com/tailwindlabs/tailwindcss/releases/download/v{TAILWIND_VERSION}/{name}"
+    fetch_pinned(url, path, TAILWIND_SHA256[name])
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def build_css(out: str) -> bool:
+    binary = tailwind_bin()
+    if binary is None:
+        return False
+    with tempfile.NamedTemporaryFile("w", suffix=".css", delete=False) as f:
+        f.write(TAILWIND_INPUT)
+    try:
+        subprocess.run(
+            [binary, "-i", f.name, "-o", out, "--minify",
+             "--content", os.path.join(ROOT, "templates", "**", "*.html")],
+            check=True,
+        )
+    finally:
+        os.unlink(f.name)
+    return True
+
+
+def vendor_chartjs(out: str) -> bool:
+    src = os.getenv("CHARTJS_SRC")
+    if src:
+        shutil.copyfile(src, out)
+        return True
+    if CHARTJS_SHA256 is None:
+        return False
+    cached = os.path.join(CACHE, f"chart.js-{CHARTJS_VERSION}.umd.min.js")
+    fetch_pinned(CHARTJS_URL, cached, CHARTJS_SHA256)
+    shutil.copyfile(cached, out)
+    return True
+
+
+def fingerprint(src: str, logical: str) -> str:
+    """Copy src into DIST under a content-hashed name; return that name."""
+    with open(src, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    base, ext = os.path.splitext(logical)
+    hashed = f"{base}.{digest}{ext}"
+    dest = os.path.join(DIST, hashed)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, "wb") as f:
+        f.write(data)
+    if ext in COMPRESSIBLE:
+        with open(dest + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(dest + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+    return hashed
+
+
+def image_variants(logical: str, src: str) -> dict:
+    """Encode src at each width up to its own in every supported format."""
+    with open(src, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    cache = os.path.join(CACHE, "images", digest)
+    os.makedirs(cache, exist_ok=True)
+    base = os.path.splitext(logical)[0]
+
+    with Image.open(src) as im:
+        im = im.convert("RGB")
+        width, height = im.size
+        widths = [w for w in IMAGE_WIDTHS if w < width] + [width]
+        variants = {}
+        for fmt, options in IMAGE_FORMATS.items():
+            if not features.check(fmt):
+                print(f"  Pillow has no {fmt} support; skipping")
+                continue
+            variants[fmt] = []
+            for w in widths:
+                out = os.path.join(cache, f"{w}.{fmt}")
+                if not os.path.exists(out):
+                    resized = im if w == width else im.resize((w, round(height * w / width)), Image.LANCZOS)
+                    resized.save(out, fmt.upper(), **options)
+                variants[fmt].append([w, fingerprint(out, f"{base}-{w}w.{fmt}")])
+    return {"width": width, "height": height, "variants": variants}
+
+
+def render_sw(assets: dict, version: str):
+    with open(os.path.join(STATIC, "sw.js"), encoding="utf-8") as f:
+        sw = f.read()
+    urls = [f"/assets/{assets[name]}" for name in PRECACHE if name in assets]
+    head = f'const ASSET_VERSION = "dev";\nconst ASSET_URLS = [];\n'
+    if head not in sw:
+        sys.exit("static/sw.js no longer starts with the ASSET_VERSION/ASSET_URLS placeholders")
+    sw = sw.replace(head, f"const ASSET_VERSION = {json.dumps(version)};\nconst ASSET_URLS = {json.dumps(urls)};\n")
+    with open(os.path.join(DIST, "sw.js"), "w", encoding="utf-8") as f:
+        f.write(sw)
+
+
+def main():
+    shutil.rmtree(DIST, ignore_errors=True)
+    os.makedirs(DIST)
+    work = tempfile.mkdtemp()
+    try:
+        sources = {}
+        print("Compiling Tailwind CSS")
+        css = os.path.join(work, "app.css")
+        if build_css(css):
+            sources["app.css"] = css
+        else:
+            print("  no tailwindcss and no pinned release for this platform; pages use the CDN build")
+        print(f"Vendoring Chart.js {CHARTJS_VERSION}")
+        chartjs = os.path.join(work, "chart.umd.min.js")
+        if vendor_chartjs(chartjs):
+            sources["vendor/chart.umd.min.js"] = chartjs
+        else:
+            print("  no CHARTJS_SRC and no pinned digest; pages use the CDN build")
+        sources.update({name: os.path.join(STATIC, name) for name in STATIC_ASSETS})
+        assets = {name: fingerprint(path, name) for name, path in sorted(sources.items())}
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    images = {}
+    if Image is None:
+        print("Pillow not installed; skipping responsive image variants")
+    else:
+        print("Encoding responsive image variants")
+        images = {name: image_variants(name, os.path.join(STATIC, name)) for name in IMAGES}
+
+    version = hashlib.sha256(json.dumps([assets, images], sort_keys=True).encode()).hexdigest()[:12]
+    with open(os.path.join(DIST, "assets.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "assets": assets, "images": images}, f, indent=2, sort_keys=True)
+    render_sw(assets, version)
+    print(f"Built {len(assets)} assets (version {version}) into {os.path.relpath(DIST, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
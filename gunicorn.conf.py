@@ -0,0 +1,41 @@
+"""gunicorn settings, read automatically from the working directory.
+
+With preload (GUNICORN_PRELOAD, on by default) the master imports the app,
+migrates the schema and compiles the templates once, then forks workers that
+start warm. Without it every worker imports the app itself; the first to get
+the migration lock migrates and the rest just check the version. Each worker
+logs a JSON `worker_ready` line with its boot time (see bench.py startup).
+"""
+import json
+import os
+import time
+
+preload_app = bool(int(os.getenv("GUNICORN_PRELOAD", "1")))
+
+_forked_at = None
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    started = time.perf_counter()
+    from app import app, db, ensure_schema, warm
+
+    with app.app_context():
+        ensure_schema()
+        warm()
+        # Workers must not inherit the master's connections
+        db.engine.dispose()
+    server.log.info(json.dumps({"event": "master_ready", "ms": round((time.perf_counter() - started) * 1000, 1)}))
+
+
+def post_fork(server, worker):
+    global _forked_at
+    _forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    worker.log.info(json.dumps({
+        "event": "worker_ready", "pid": worker.pid, "preload": preload_app, "at": time.time(),
+        "boot_ms": round((time.perf_counter() - _forked_at) * 1000, 1),
+    }))
@@ -1,5 +1,102 @@
-const CACHE_NAME = "fittrack-v2";
-const URLS = ["/", "/guides", "/reset", "/weekly", "/static/manifest.json"];
+// Replaced in static/dist/sw.js by build_assets.py; "dev" when unbuilt
+const ASSET_VERSION = "dev";
+const ASSET_URLS = [];
+const CACHE_NAME = "fittrack-" + ASSET_VERSION;
+const URLS = ["/", "/guides", "/reset", "/weekly", "/static/manifest.json", ...ASSET_URLS];
+
+// Offline write queue: form posts that fail while offline are stored in
+// IndexedDB and flushed to /sync in queue order (see app.py sync()).
+const QUEUE_DB = "fittrack-queue";
+const QUEUE_STORE = "ops";
+const SYNC_TAG = "fittrack-sync";
+const SYNC_BATCH = 500; // ops per /sync request; app.py SYNC_MAX_OPS
+
+// Queueable form posts: path -> [op type, extra fields]
+function queuedOp(url) {
+  const path = new URL(url).pathname;
+  if (path === "/meal/add") return ["meal_add", {}];
+  if (path === "/meal/quick_add") return ["meal_quick_add", {}];
+  if (path === "/day/update") return ["day_update", {}];
+  if (path === "/workouts") return ["workout_add", {}];
+  const m = path.match(/^\/saved\/log\/(\d+)$/);
+  if (m) return ["saved_log", { sid: m[1] }];
+  return null;
+}
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(QUEUE_DB, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(QUEUE_STORE, { keyPath: "id" });
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+function queueTx(mode, fn) {
+  return openQueue().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction(QUEUE_STORE, mode);
+    const req = fn(tx.objectStore(QUEUE_STORE));
+    tx.oncomplete = () => resolve(req ? req.result : undefined);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+function newId() {
+  if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+}
+
+function localDate() {
+  const d = new Date();
+  return new Date(d.getTime() - d.getTimezoneOffset() * 60000).toISOString().slice(0, 10);
+}
+
+let flushing = null;
+
+function sendOps(ops) {
+  return fetch("/sync", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ops: ops.map(({ id, type, data }) => ({ id, type, data })) }),
+  })
+    .then((res) => (res.ok ? res.json() : Promise.reject(res.status)))
+    .then((result) => {
+      // Rejected ops will never apply; drop them with the applied ones.
+      const done = [...result.applied, ...result.duplicate, ...result.errors.map((e) => e.id)];
+      return queueTx("readwrite", (store) => { done.forEach((id) => id && store.delete(id)); });
+    });
+}
+
+function flushQueue() {
+  if (flushing) return flushing;
+  flushing = queueTx("readonly", (store) => store.getAll())
+    .then(async (ops) => {
+      // Oldest first, SYNC_BATCH at a time; each chunk leaves the queue as
+      // soon as it is acknowledged, so a failure resends only the rest.
+      ops = (ops || []).sort((a, b) => (a.queued_at || 0) - (b.queued_at || 0));
+      for (let i = 0; i < ops.length; i += SYNC_BATCH) {
+        await sendOps(ops.slice(i, i + SYNC_BATCH));
+      }
+    })
+    .catch(() => {})
+    .finally(() => { flushing = null; });
+  return flushing;
+}
+
+async function queueOrSend(request, [type, extra]) {
+  const form = await request.clone().formData();
+  try {
+    const res = await fetch(request);
+    flushQueue();
+    return res;
+  } catch (err) {
+    const data = Object.assign(Object.fromEntries(form), extra);
+    if (!data.day) data.day = localDate();
+    await queueTx("readwrite", (store) => store.put({ id: newId(), type, data, queued_at: Date.now() }));
+    if (self.registration.sync) self.registration.sync.register(SYNC_TAG).catch(() => {});
+    return Response.redirect(request.referrer || "/", 303);
+  }
+}
 
 self.addEventListener("install", (event) => {
   event.waitUntil(
@@ -13,7 +110,34 @@ self.addEventListener("activate", (event) => {
   );
 });
 
+self.addEventListener("sync", (event) => {
+  if (event.tag === SYNC_TAG) event.waitUntil(flushQueue());
+});
+
+self.addEventListener("message", (event) => {
+  if (event.data === "flush") event.waitUntil(flushQueue());
+});
+
 self.addEventListener("fetch", (event) => {
+  if (event.request.method === "POST") {
+    const op = queuedOp(event.request.url);
+    if (op) event.respondWith(queueOrSend(event.request, op));
+    return;
+  }
+  if (event.request.method !== "GET") return;
+
+  // Fingerprinted assets never change: cache first
+  if (new URL(event.request.url).pathname.startsWith("/assets/")) {
+    event.respondWith(
+      caches.match(event.request).then((hit) => hit || fetch(event.request).then((res) => {
+        const copy = res.clone();
+        caches.open(CACHE_NAME).then((cache) => cache.put(event.request, copy)).catch(()=>{});
+        return res;
+      }))
+    );
+    return;
+  }
+
   // Network first for dynamic pages; cache fallback
   event.respondWith(
     fetch(event.request).then((res) => {